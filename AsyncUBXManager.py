@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""asyncio counterpart of UBXManager."""
+
+import asyncio
+from UBXFramer import UBXFramer
+from UBXManager import UBXDispatcher
+from UBXMessage import formatByteString, detachMessage
+from UBXRequests import messageKey
+
+
+class AsyncUBXManager(UBXDispatcher):
+    """The NMEA/UBX reader/writer working on asyncio streams.
+
+    The manager reads from an asyncio StreamReader and writes to a
+    StreamWriter, e.g. a TCP connection to a ser2net bridge (see
+    openConnection) or a serial port (see openSerial). It uses the same
+    UBXFramer and UBXDispatcher as UBXManager, so requests and subscribe
+    work the same way.
+
+    Parsed UBX messages are delivered by iterating over the manager:
+
+        async for obj in manager:
+            print(obj)
+
+    Responses to polls and ACK/NAKs of sets are awaited with request and
+    requestAck. The messages consumed this way are not delivered to the
+    iterator.
+    """
+
+    chunkSize = 4096
+
+    def __init__(self, reader, writer, debug=False, columnar=False,
+                 lazy=False, nmea=False, maxQueueSize=1000):
+        """Instantiate with an asyncio StreamReader and StreamWriter.
+
+        If nmea is True NMEA sentences (as str) are delivered to the
+        iterator, too. At most maxQueueSize messages are queued for the
+        iterator, beyond that the oldest messages are dropped.
+        """
+        self.reader = reader
+        self.writer = writer
+        self._initDispatcher(debug, columnar, lazy, False)
+        self.nmea = nmea
+        self._framer = UBXFramer(self)
+        self._queue = asyncio.Queue(maxQueueSize)
+        self._task = None
+
+    @classmethod
+    async def openConnection(cls, host, port, **kwargs):
+        """Connect to host:port via TCP, e.g. to a ser2net bridge."""
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer, **kwargs)
+
+    @classmethod
+    async def openSerial(cls, url, baudrate=9600, **kwargs):
+        """Open serial port url, this needs the pyserial-asyncio package."""
+        import serial_asyncio
+        reader, writer = await serial_asyncio.open_serial_connection(
+            url=url, baudrate=baudrate
+        )
+        return cls(reader, writer, **kwargs)
+
+    def start(self):
+        """Start reading in a task of the running event loop."""
+        self._task = asyncio.ensure_future(self.run())
+        return self._task
+
+    async def run(self):
+        """Read and dispatch until the end of the stream.
+
+        The iterator ends when reading ends, also by close() or an error.
+        """
+        try:
+            while True:
+                data = await self.reader.read(self.chunkSize)
+                if not data:
+                    break
+                self._framer.feed(data)
+        finally:
+            self._put(None)     # end of stream
+
+    async def close(self):
+        """Stop reading and close the writer."""
+        if self._task is not None:
+            self._task.cancel()
+        self._requests.cancelAll()
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        obj = await self._queue.get()
+        if obj is None:
+            raise StopAsyncIteration
+        return obj
+
+    def _put(self, obj):
+        """Queue obj for the iterator, dropping the oldest if full."""
+        if self._queue.full():
+            self._queue.get_nowait()
+        self._queue.put_nowait(obj)
+
+    async def send(self, msg):
+        """Send message msg (bytes or a message object)."""
+        if not isinstance(msg, (bytes, bytearray)):
+            msg = msg.serialize()
+        if self.debug:
+            print("SEND: {}".format(formatByteString(msg)))
+        self.writer.write(msg)
+        await self.writer.drain()
+
+    async def request(self, msg, timeout=None):
+        """Send poll msg and return the response message.
+
+        The response is the next message with the class and ID of msg.
+        Raises an Exception if the receiver answers with a NAK and
+        asyncio.TimeoutError if there is no answer within timeout seconds.
+        Concurrent requests are pipelined.
+        """
+        future = self._requests.expect(*messageKey(msg))
+        return await self._wait(future, msg, timeout)
+
+    async def requestAck(self, msg, timeout=None):
+        """Send msg and return True if it is ACKed, False if it is NAKed.
+
+        Raises asyncio.TimeoutError if there is no answer within timeout
+        seconds.
+        """
+        future = self._requests.expectAck(*messageKey(msg))
+        return await self._wait(future, msg, timeout)
+
+    async def _wait(self, future, msg, timeout):
+        future = asyncio.wrap_future(future)
+        try:
+            await self.send(msg)
+        except BaseException:
+            future.cancel()
+            raise
+        return await asyncio.wait_for(future, timeout)
+
+    def onUBX(self, obj):
+        """Default handler for good UBX message: queue it for iteration."""
+        self._put(detachMessage(obj))   # it is kept in the queue
+
+    def onNMEA(self, buffer):
+        """Default handler for good NMEA message: queue it if self.nmea."""
+        if self.nmea:
+            self._put(buffer)
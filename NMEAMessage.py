@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""Typed NMEA sentences: GGA, RMC, GSA, GSV, VTG, GLL, ZDA, GNS and GST.
+
+Sentences are parsed from the body UBXManager passes to onNMEA, e.g.
+"GPGGA,092725.00,4717.11399,N,...", i.e. without '$' and checksum. Empty
+fields become None, times are seconds since midnight, latitudes and
+longitudes are signed degrees.
+"""
+
+from UBXMessage import numpy
+
+
+def _time(v):
+    """hhmmss.ss -> seconds since midnight."""
+    return int(v[0:2]) * 3600 + int(v[2:4]) * 60 + float(v[4:])
+
+
+def _lat(v):
+    """ddmm.mmmmm -> degrees."""
+    return int(v[0:2]) + float(v[2:]) / 60
+
+
+def _lon(v):
+    """dddmm.mmmmm -> degrees."""
+    return int(v[0:3]) + float(v[3:]) / 60
+
+
+def _hex(v):
+    return int(v, 16)
+
+
+class NMEASentence(object):
+    """Base class of the sentence types.
+
+    Fields is a list of (name, converter) of the fields in order. A
+    sentence type with repeated blocks defines Repeated, a list of (name,
+    converter), and _repeatStart, the index of the first repeated field;
+    the repeated fields become lists.
+    """
+
+    Fields = []
+    Repeated = None
+    _repeatStart = None
+    _repeatCount = None     # fixed number of blocks, None: up to the end
+
+    def __init__(self, sentence):
+        """Instantiate from the sentence body "GPGGA,..."."""
+        values = sentence.split(',')
+        self.talker = values[0][:-3]
+        values = values[1:]
+        if self.Repeated is not None:
+            values = self._splitRepeated(values)
+        for (name, convert), v in zip(self.Fields, values):
+            try:
+                setattr(self, name, convert(v) if v else None)
+            except ValueError:
+                raise Exception(
+                    "Cannot parse field {} of {}: {!r}"
+                    .format(name, self._type, v)
+                )
+        for name, _ in self.Fields[len(values):]:
+            setattr(self, name, None)
+        if self.NS == 'S' and self.lat is not None:
+            self.lat = -self.lat
+        if self.EW == 'W' and self.lon is not None:
+            self.lon = -self.lon
+
+    # only GGA, RMC, GLL and GNS have positions
+    NS = EW = lat = lon = None
+
+    def _splitRepeated(self, values):
+        """Collect the repeated blocks in lists, return the other values."""
+        start, width = self._repeatStart, len(self.Repeated)
+        count = self._repeatCount
+        if count is None:
+            count = (len(values) - start) // width
+        end = start + count * width
+        for j, (name, convert) in enumerate(self.Repeated):
+            column = []
+            for v in values[start+j:end:width]:
+                if v:
+                    try:
+                        column.append(convert(v))
+                    except ValueError:
+                        raise Exception(
+                            "Cannot parse field {} of {}: {!r}"
+                            .format(name, self._type, v)
+                        )
+                elif count == self._repeatCount:
+                    continue    # unused slots, e.g. the satellites of GSA
+                else:
+                    column.append(None)
+            setattr(self, name, column)
+        return values[:start] + values[end:]
+
+    def __str__(self):
+        """Return human readable string."""
+        s = "{}{}:".format(self.talker, self._type)
+        for name, _ in self.Fields + (self.Repeated or []):
+            s += "\n  {}={}".format(name, getattr(self, name))
+        return s
+
+
+# Maps the sentence type ("GGA") to its class.
+_registry = {}
+
+
+def registerSentence(cls):
+    """Register cls for the sentence type of its name, return cls."""
+    cls._type = cls.__name__
+    _registry[cls._type] = cls
+    return cls
+
+
+def lookupSentence(sentenceType):
+    """Return the class of sentenceType ("GGA") or None."""
+    return _registry.get(sentenceType)
+
+
+def parseNMEASentence(sentence):
+    """Parse the sentence body "GPGGA,..." into its sentence class."""
+    cls = _registry.get(sentence[2:5])
+    if cls is None:
+        raise Exception("Cannot parse sentence {!r}".format(sentence[:5]))
+    return cls(sentence)
+
+
+@registerSentence
+class GGA(NMEASentence):
+    """Global positioning system fix data."""
+    Fields = [
+        ('time', _time), ('lat', _lat), ('NS', str), ('lon', _lon),
+        ('EW', str), ('quality', int), ('numSV', int), ('HDOP', float),
+        ('alt', float), ('altUnit', str), ('sep', float), ('sepUnit', str),
+        ('diffAge', float), ('diffStation', str),
+    ]
+
+
+@registerSentence
+class RMC(NMEASentence):
+    """Recommended minimum data."""
+    Fields = [
+        ('time', _time), ('status', str), ('lat', _lat), ('NS', str),
+        ('lon', _lon), ('EW', str), ('spd', float), ('cog', float),
+        ('date', str), ('mv', float), ('mvEW', str), ('posMode', str),
+        ('navStatus', str),
+    ]
+
+
+@registerSentence
+class GSA(NMEASentence):
+    """GNSS DOP and active satellites."""
+    Fields = [
+        ('opMode', str), ('navMode', int), ('PDOP', float), ('HDOP', float),
+        ('VDOP', float), ('systemId', _hex),
+    ]
+    Repeated = [('svid', int)]
+    _repeatStart = 2
+    _repeatCount = 12
+
+
+@registerSentence
+class GSV(NMEASentence):
+    """GNSS satellites in view."""
+    Fields = [
+        ('numMsg', int), ('msgNum', int), ('numSV', int),
+        ('signalId', _hex),
+    ]
+    Repeated = [('svid', int), ('elv', int), ('az', int), ('cno', int)]
+    _repeatStart = 3
+
+
+@registerSentence
+class VTG(NMEASentence):
+    """Course over ground and ground speed."""
+    Fields = [
+        ('cogt', float), ('cogtUnit', str), ('cogm', float),
+        ('cogmUnit', str), ('knots', float), ('knotsUnit', str),
+        ('kph', float), ('kphUnit', str), ('posMode', str),
+    ]
+
+
+@registerSentence
+class GLL(NMEASentence):
+    """Latitude and longitude, with time of position fix and status."""
+    Fields = [
+        ('lat', _lat), ('NS', str), ('lon', _lon), ('EW', str),
+        ('time', _time), ('status', str), ('posMode', str),
+    ]
+
+
+@registerSentence
+class ZDA(NMEASentence):
+    """Time and date."""
+    Fields = [
+        ('time', _time), ('day', int), ('month', int), ('year', int),
+        ('ltzh', int), ('ltzn', int),
+    ]
+
+
+@registerSentence
+class GNS(NMEASentence):
+    """GNSS fix data."""
+    Fields = [
+        ('time', _time), ('lat', _lat), ('NS', str), ('lon', _lon),
+        ('EW', str), ('posMode', str), ('numSV', int), ('HDOP', float),
+        ('alt', float), ('sep', float), ('diffAge', float),
+        ('diffStation', str), ('navStatus', str),
+    ]
+
+
+@registerSentence
+class GST(NMEASentence):
+    """GNSS pseudorange error statistics."""
+    Fields = [
+        ('time', _time), ('rangeRms', float), ('stdMajor', float),
+        ('stdMinor', float), ('orient', float), ('stdLat', float),
+        ('stdLong', float), ('stdAlt', float),
+    ]
+
+
+def columns(sentences, sentenceCls, onError=None):
+    """Decode the sentences of type sentenceCls into columns.
+
+    sentences is an iterable of sentence bodies, e.g. from readSentences.
+    Returns a dict mapping each field name (and 'talker') to a list of
+    values or, with NumPy, numeric fields to float arrays with NaN for
+    empty fields. Repeated fields are lists of lists. Sentences that do
+    not parse are skipped, onError(errMsg) is called for each of them.
+    """
+    names = ['talker'] + [name for name, _ in sentenceCls.Fields] + \
+        [name for name, _ in sentenceCls.Repeated or []]
+    cols = dict((name, []) for name in names)
+    appends = [cols[name].append for name in names]
+    prefix = sentenceCls._type
+    for sentence in sentences:
+        if sentence[2:5] != prefix:
+            continue
+        try:
+            obj = sentenceCls(sentence)
+        except Exception as e:
+            if onError is not None:
+                onError("No parse, \"{}\", sentence={}".format(e, sentence))
+            continue
+        for name, append in zip(names, appends):
+            append(getattr(obj, name))
+    if numpy is not None:
+        numeric = set(name for name, convert in sentenceCls.Fields
+                      if convert not in (str,))
+        for name in numeric:
+            cols[name] = numpy.array(
+                [numpy.nan if v is None else v for v in cols[name]],
+                dtype=float
+            )
+    return cols
+
+
+def readSentences(path, chunkSize=1 << 20):
+    """Yield the bodies of the valid NMEA sentences of a log file.
+
+    The log may mix NMEA and UBX, e.g. UBX.log of UBXManager; it is read
+    in chunks, so memory use does not depend on its size.
+    """
+    from UBXFramer import UBXFramer
+
+    class Sink:
+        def __init__(self):
+            self.sentences = []
+        def _onNMEA(self, buffer):
+            self.sentences.append(buffer)
+        def _onUBX(self, msgClass, msgId, buffer):
+            pass
+        def _onUBXError(self, msgClass, msgId, errMsg):
+            pass
+        def _onNMEAError(self, errMsg):
+            pass
+
+    sink = Sink()
+    framer = UBXFramer(sink)
+    with open(path, 'rb') as f:
+        while framer.readFrom(f, chunkSize):
+            yield from sink.sentences
+            sink.sentences = []
@@ -125,13 +125,13 @@ class R8:
 
 class CH:
     """ASCII / ISO 8859.1 Encoding."""
-    fmt = None  # Not needed
     def __init__(self, _ord, N, allowed=[], nullTerminatedString=False):
         self.N = N
         self.ord = _ord
         self._size = N
         self._nullTerminatedString = nullTerminatedString
         self.ctype = "char[{}]".format(self.N)
+        self.fmt = "{}s".format(N)
     def parse(self, msg):
         if len(msg) < self.N:
             err = "Message length {} is shorter than required {}"\
@@ -141,22 +141,32 @@ class CH:
         if self._nullTerminatedString:
             val = stringFromByteString(val)
         return val, msg[self._size:]
+    def decode(self, val):
+        """Convert the bytes unpacked by struct to the field value."""
+        return stringFromByteString(val) if self._nullTerminatedString else val
+    def encode(self, val):
+        """Convert the field value to bytes for packing with struct."""
+        return val.encode('ascii') if isinstance(val, str) else val
     @staticmethod
     def toString(val):
         return '"{}"'.format(val)
     def serialize(self, val):
-        if len(val) != self.N:
+        val = self.encode(val)
+        if len(val) > self.N or \
+           (len(val) != self.N and not self._nullTerminatedString):
             err = "Value length {} not equal to the required {}"\
                   .format(len(val), self._size)
             raise Exception(err)
+        return pack(self.fmt, val)
 
 class U:
     """Variable-length array of unsigned chars."""
-    fmt = None  # Not needed
     def __init__(self, _ord, N, allowed=[]):
         self.ord = _ord
         self.N = N
+        self._size = N
         self.ctype = "uint8_t[{}]".format(self.N)
+        self.fmt = "{}s".format(N)
     def parse(self, msg):
         if len(msg) < self.N:
             err = "Message length {} is shorter than required {}"\
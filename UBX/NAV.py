@@ -29,6 +29,7 @@ class NAV:
         """§32.18.17.1 Satellite Information."""
 
         _id = 0x35
+        _repeatedName = 'svs'
 
         class Fields:
             iTOW = U4(1)
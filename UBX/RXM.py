@@ -15,6 +15,7 @@ class RXM:
         """§32.19.7.2 Broadcast Navigation Data Subframe."""
 
         _id = 0x13
+        _repeatedName = 'words'
 
         class Fields:
             gnssId = U1(1)
@@ -34,6 +35,7 @@ class RXM:
         """§32.19.4.1 Multi-GNSS Raw Measurement Data."""
 
         _id = 0x15
+        _repeatedName = 'meas'
 
         class Fields:
             rcvrTow = R8(1)
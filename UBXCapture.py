@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Buffered, rotating and optionally compressed capture of a byte stream."""
+
+import gzip
+import lzma
+import os
+import sys
+import threading
+from collections import Counter
+from time import monotonic
+
+
+class UBXCapture:
+    """Write a capture from a background thread in large blocks.
+
+    write() only appends to an in-memory buffer. A background thread writes
+    the buffer when it holds bufferSize bytes and at least every
+    flushInterval seconds, then flushes the file, so logging costs about
+    one write and one flush per interval instead of one per read.
+
+    Without rotation everything goes to path. With maxBytes (of capture
+    data, before compression) or maxSeconds the capture is split into
+    segments path-0000, path-0001, ... (the number goes before the
+    extension). A new segment is started at the first frame start (UBX sync
+    chars or '$' at the start of a line) after the limit was reached, so
+    each segment can be decoded on its own. With compress='gzip' or 'lzma'
+    each segment is compressed, ".gz" or ".xz" is appended to its name.
+
+    self.segments lists the paths written so far, self.counters has bytes,
+    writes, flushes, segments and errors.
+    """
+
+    RX, TX = 0, 1       # directions of record()
+    _suffixes = {None: '', 'gzip': '.gz', 'lzma': '.xz'}
+
+    def __init__(self, path='UBX.log', maxBytes=None, maxSeconds=None,
+                 compress=None, bufferSize=1 << 20, flushInterval=1.0):
+        """Instantiate, open the first segment and start the thread."""
+        if compress not in self._suffixes:
+            raise Exception("Unknown compression {!r}".format(compress))
+        self.path = path
+        self.maxBytes = maxBytes
+        self.maxSeconds = maxSeconds
+        self.compress = compress
+        self.bufferSize = bufferSize
+        self.flushInterval = flushInterval
+        self.segments = []
+        self.counters = Counter()
+        self._buffer = bytearray()
+        self._cond = threading.Condition()
+        self._flushed = 0           # number of completed flushes
+        self._flushRequests = 0
+        self._closed = False
+        self._file = None
+        self._open()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, data):
+        """Append data to the capture."""
+        with self._cond:
+            self._append(data)
+
+    def record(self, data, direction=RX, source=None):
+        """Capture data received or sent (direction TX).
+
+        The raw log only holds what was received, sent data is dropped.
+        """
+        if direction == self.RX:
+            self.write(data)
+
+    def _append(self, data):
+        """Append data to the buffer, with the lock held."""
+        if self._closed:
+            raise Exception("{} is closed".format(type(self).__name__))
+        self._buffer += data
+        if len(self._buffer) >= self.bufferSize:
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Write and flush what was captured so far.
+
+        Returns False if that did not happen within timeout seconds.
+        """
+        with self._cond:
+            self._flushRequests += 1
+            request = self._flushRequests
+            self._cond.notify_all()
+            return self._cond.wait_for(
+                lambda: self._flushed >= request or self._closed, timeout
+            )
+
+    def close(self, timeout=None):
+        """Write what is buffered and close the current segment."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def _segmentPath(self):
+        path = self.path
+        if self.maxBytes is not None or self.maxSeconds is not None:
+            stem, ext = os.path.splitext(path)
+            path = "{}-{:04d}{}".format(stem, len(self.segments), ext)
+        return path + self._suffixes[self.compress]
+
+    def _open(self):
+        path = self._segmentPath()
+        if self.compress == 'gzip':
+            self._file = gzip.open(path, 'wb', compresslevel=6)
+        elif self.compress == 'lzma':
+            self._file = lzma.open(path, 'wb')
+        else:
+            self._file = open(path, 'wb')
+        self.segments.append(path)
+        self.counters['segments'] += 1
+        self._segmentBytes = 0
+        self._segmentStart = monotonic()
+
+    def _rotationDue(self):
+        return (self.maxBytes is not None and
+                self._segmentBytes >= self.maxBytes) or \
+            (self.maxSeconds is not None and
+             monotonic() - self._segmentStart >= self.maxSeconds)
+
+    def _write(self, data):
+        """Write data, starting a new segment at a frame start if due."""
+        view = memoryview(data)
+        pos = 0
+        while pos < len(data):
+            if self._segmentBytes and self._rotationDue():
+                end = _frameStart(data, pos)
+                if end == pos:
+                    self._file.close()
+                    self._open()
+                    continue
+            elif self.maxBytes is not None:
+                end = min(len(data),
+                          pos + max(self.maxBytes - self._segmentBytes, 1))
+            else:
+                end = len(data)
+            self._file.write(view[pos:end])
+            self._segmentBytes += end - pos
+            self.counters['writes'] += 1
+            pos = end
+
+    def _run(self):
+        """Writer thread: write the buffer every interval or when full."""
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._closed or
+                    self._flushRequests > self._flushed or
+                    len(self._buffer) >= self.bufferSize,
+                    self.flushInterval
+                )
+                data, self._buffer = bytes(self._buffer), bytearray()
+                request = self._flushRequests
+                closed = self._closed
+            try:
+                if data:
+                    self._write(data)
+                    self.counters['bytes'] += len(data)
+                if closed:
+                    self._file.close()
+                elif data:
+                    self._file.flush()
+                    self.counters['flushes'] += 1
+            except Exception as e:
+                self.counters['errors'] += 1
+                sys.stderr.write("{}: {}\n".format(type(self).__name__, e))
+            with self._cond:
+                self._flushed = request
+                self._cond.notify_all()
+            if closed:
+                return
+
+
+def _frameStart(data, pos):
+    """Return the index of the first frame start in data from pos on.
+
+    That is the next UBX sync chars or a '$' at the start of a line,
+    len(data) if there is none.
+    """
+    starts = [i for i in (data.find(b'\xb5\x62', pos),
+                          data.find(b'\n$', pos - 1 if pos else 0))
+              if i >= 0]
+    if not starts:
+        return len(data)
+    i = min(starts)
+    return i + 1 if data[i] == 0x0a else i
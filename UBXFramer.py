@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""Split a byte stream into NMEA sentences and UBX frames."""
+
+from functools import reduce
+from operator import xor
+
+
+# Maps the ASCII code of a hex digit to its value.
+_HEX = dict(
+    [(ord(c), int(c, 16)) for c in "0123456789abcdefABCDEF"]
+)
+
+
+class UBXFramer:
+    """Bulk framing engine.
+
+    Bytes are appended with feed() or read directly into the buffer with
+    readFrom(). Complete frames are located with bytearray.find, sliced
+    out using the UBX length field and only then checksummed. The results
+    are handed to the sink, which must implement the UBXManager callbacks
+    _onUBX, _onUBXError, _onNMEA and _onNMEAError.
+
+    The buffer is preallocated and reused. UBX payloads are passed to
+    _onUBX as memoryview slices of it, they are only valid during the
+    call. A sink that keeps a payload must copy it.
+    """
+
+    bufferSize = 1 << 16
+    maxNMEALength = 1024   # give up on a '$' not followed by '*' in time
+
+    def __init__(self, sink, bufferSize=None):
+        """Instantiate with the sink that receives the frames."""
+        self.sink = sink
+        if bufferSize is not None:
+            self.bufferSize = bufferSize
+        self._allocate(self.bufferSize)
+        self.bytesSkipped = 0
+        self.resyncs = 0        # runs of skipped bytes
+        self._skipping = False
+
+    def _allocate(self, size):
+        """Replace the buffer by a new one of size bytes.
+
+        A new buffer is allocated rather than the old one resized, so
+        views of the old buffer that are still around stay valid.
+        """
+        self.buffer = bytearray(size)
+        self._view = memoryview(self.buffer)
+        self._start = self._end = 0     # the unprocessed bytes
+
+    def reset(self):
+        """Drop any partially received frame."""
+        self._start = self._end = 0
+
+    def _reserve(self, n):
+        """Make room for n more bytes at the end of the unprocessed bytes."""
+        if self._end + n <= len(self.buffer):
+            return
+        start, end = self._start, self._end
+        if end - start + n <= len(self.buffer):
+            # a slice copy, memcpy from a view of the same buffer is not
+            # defined for overlapping ranges
+            self.buffer[:end-start] = self.buffer[start:end]
+        else:
+            old = self._view[start:end]
+            self._allocate(max(2 * len(self.buffer), end - start + n))
+            self.buffer[:end-start] = old
+        self._start, self._end = 0, end - start
+
+    def feed(self, data):
+        """Append data and dispatch all complete frames."""
+        n = len(data)
+        self._reserve(n)
+        self.buffer[self._end:self._end+n] = data
+        self._end += n
+        self._dispatch()
+
+    def readFrom(self, stream, size, onRead=None):
+        """Read up to size bytes from stream into the buffer and dispatch.
+
+        Uses stream.readinto1 or readinto if available, so the bytes are
+        not copied. Returns a memoryview of the bytes read, which is valid
+        until the next call of feed or readFrom. onRead(view) is called
+        with the bytes read before they are dispatched, e.g. to record
+        them with the time they were received.
+        """
+        self._reserve(size)
+        end = self._end
+        view = self._view[end:end+size]
+        readinto = getattr(stream, 'readinto1', None) or \
+            getattr(stream, 'readinto', None)
+        if readinto is not None:
+            n = readinto(view) or 0
+        else:
+            data = stream.read(size)
+            n = len(data)
+            view[:n] = data
+        self._end = end + n
+        if onRead is not None and n:
+            onRead(self._view[end:end+n])
+        self._dispatch()
+        return self._view[end:end+n]
+
+    def _dispatch(self):
+        self._start = self._scan(self.buffer, self._view, self._start,
+                                 self._end)
+        if self._start == self._end:
+            self._start = self._end = 0
+
+    def _skip(self, n):
+        """Count n skipped bytes, a new run of them is a resync."""
+        self.bytesSkipped += n
+        if not self._skipping:
+            self._skipping = True
+            self.resyncs += 1
+
+    def _scan(self, buf, view, pos, n):
+        """Dispatch the frames in buf[pos:n], return where to continue."""
+        from UBXMessage import UBXMessage
+        sink = self.sink
+        nextUBX = nextNMEA = -2     # -2: not searched yet, -1: not found
+        while pos < n:
+            if nextUBX != -1 and nextUBX < pos:
+                nextUBX = buf.find(b'\xb5', pos, n)
+            if nextNMEA != -1 and nextNMEA < pos:
+                nextNMEA = buf.find(b'$', pos, n)
+            if nextUBX == -1 and nextNMEA == -1:
+                self._skip(n - pos)
+                return n
+            if nextNMEA == -1 or (nextUBX != -1 and nextUBX < nextNMEA):
+                i = nextUBX
+                if i > pos:
+                    self._skip(i - pos)
+                if i + 6 > n:
+                    return i
+                if buf[i+1] != 0x62:
+                    self._skip(1)
+                    pos = i + 1
+                    continue
+                end = i + 8 + (buf[i+4] | buf[i+5] << 8)
+                if end > n:
+                    return i
+                self._skipping = False
+                msgClass, msgId = buf[i+2], buf[i+3]
+                chksum = buf[end-2] << 8 | buf[end-1]
+                chksumCalc = UBXMessage.Checksum(view[i+2:end-2]).get()
+                if chksum == chksumCalc:
+                    sink._onUBX(msgClass, msgId, view[i+6:end-2])
+                else:
+                    sink._onUBXError(
+                        msgClass, msgId,
+                        "Incorrect Checksum: {:04X} should be {:04X}"
+                        .format(chksumCalc, chksum)
+                    )
+                pos = end
+            else:
+                j = nextNMEA
+                if j > pos:
+                    self._skip(j - pos)
+                k = buf.find(b'*', j + 1, min(j + self.maxNMEALength, n))
+                nl = buf.find(b'\n', j + 1, k if k != -1 else n)
+                if nl != -1:    # line ended before the checksum
+                    self._skip(nl + 1 - j)
+                    pos = nl + 1
+                    continue
+                if k == -1:
+                    if n - j < self.maxNMEALength:
+                        return j
+                    self._skip(1)
+                    pos = j + 1
+                    continue
+                if k + 3 > n:
+                    return j
+                hi, lo = _HEX.get(buf[k+1]), _HEX.get(buf[k+2])
+                if hi is None or lo is None:
+                    self._skip(k + 1 - j)
+                    pos = k + 1
+                    continue
+                self._skipping = False
+                chksum = 16 * hi + lo
+                body = buf[j+1:k]
+                chksumCalc = reduce(xor, body, 0)
+                if chksum != chksumCalc:
+                    sink._onNMEAError(
+                        "Incorrect Checksum: {:02X} should be {:02X}"
+                        .format(chksumCalc, chksum)
+                    )
+                else:
+                    try:
+                        sentence = body.decode('ascii')
+                    except UnicodeDecodeError:
+                        sink._onNMEAError("Non-ASCII sentence")
+                    else:
+                        sink._onNMEA(sentence)
+                pos = k + 3
+                # not counted as skipped, unless split from the sentence
+                if pos + 2 <= n and buf[pos:pos+2] == b'\r\n':
+                    pos += 2
+        return pos
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Frame and decode several receivers in worker processes."""
+
+import multiprocessing
+import queue
+import sys
+import threading
+from UBXFramer import UBXFramer
+from UBXManager import readInto
+from UBXMessage import parseUBXPayload, formatByteString, detachMessage
+
+
+# event kinds sent from the workers
+_UBX, _NMEA, _UBX_ERROR, _NMEA_ERROR, _FRAME = range(5)
+
+
+class Handler:
+    """Per-source callbacks, the defaults print like UBXManager."""
+
+    def onUBX(self, obj):
+        """Default handler for good UBX message."""
+        print(obj)
+
+    def onUBXError(self, msgClass, msgId, errMsg):
+        """Default handler for faulty or not yet defined UBX message."""
+        print("UBX ERR {:02X}:{:02X} {}"
+              .format(msgClass, msgId, errMsg))
+
+    def onNMEA(self, buffer):
+        """Default handler for good NMEA message."""
+        print("NMEA: {}".format(buffer))
+
+    def onNMEAError(self, errMsg):
+        """Default handler for faulty NMEA message."""
+        print("NMEA ERR: {}".format(errMsg))
+
+
+class UBXHub:
+    """Read many sources in a pool of worker processes.
+
+    Each source is a serial port, file or socket that is opened in the
+    worker by calling opener(), so opener must be picklable, e.g.
+    functools.partial(serial.Serial, '/dev/ttyUSB0', 9600). The workers
+    frame the byte streams and, if decode is True, parse the messages.
+    They send the events of each read chunk as one batch over a
+    multiprocessing queue to the consumer, which calls onUBX, onNMEA,
+    onUBXError and onNMEAError of the handler of the source, exactly as
+    UBXManager does. If decode is False the workers send compact
+    (msgClass, msgId, payload) tuples and the consumer parses them.
+
+    By default there is one worker per source, with processes=N the
+    sources are shared among N workers.
+    """
+
+    chunkSize = 4096
+
+    def __init__(self, processes=None, decode=True, columnar=False,
+                 maxQueueSize=1000):
+        """Instantiate; maxQueueSize is in batches, not messages."""
+        self.processes = processes
+        self.decode = decode
+        self.columnar = columnar
+        self._sources = {}      # sourceId -> (opener, handler)
+        self._queue = multiprocessing.Queue(maxQueueSize)
+        self._stop = multiprocessing.Event()
+        self._workers = []
+        self._running = set()   # sourceIds whose worker did not end yet
+
+    def addSource(self, sourceId, opener, handler=None):
+        """Add a source, handler defaults to a printing Handler."""
+        if self._workers:
+            raise Exception("Sources must be added before start()")
+        if sourceId in self._sources:
+            raise Exception("Duplicate source {!r}".format(sourceId))
+        self._sources[sourceId] = (
+            opener, Handler() if handler is None else handler
+        )
+
+    def start(self):
+        """Start the worker processes."""
+        ids = list(self._sources)
+        n = len(ids) if self.processes is None else self.processes
+        for k in range(min(n, len(ids))):
+            sources = [(sourceId, self._sources[sourceId][0])
+                       for sourceId in ids[k::n]]
+            worker = multiprocessing.Process(
+                target=_work,
+                args=(sources, self._queue, self._stop, self.decode,
+                      self.columnar, self.chunkSize),
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+        self._running = set(ids)
+
+    def run(self, timeout=None):
+        """Dispatch events until all sources ended or shutdown is called.
+
+        Returns False if no batch arrived within timeout seconds.
+        """
+        while self._running:
+            try:
+                sourceId, events = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                return False
+            if events is None:
+                self._running.discard(sourceId)
+            else:
+                self._dispatch(self._sources[sourceId][1], events)
+        return True
+
+    def _dispatch(self, handler, events):
+        for event in events:
+            kind = event[0]
+            if kind == _UBX:
+                handler.onUBX(event[1])
+            elif kind == _FRAME:
+                _, msgClass, msgId, payload = event
+                try:
+                    obj = parseUBXPayload(
+                        msgClass, msgId, payload, self.columnar
+                    )
+                except Exception as e:
+                    handler.onUBXError(msgClass, msgId, _noParse(e, payload))
+                else:
+                    handler.onUBX(obj)
+            elif kind == _NMEA:
+                handler.onNMEA(event[1])
+            elif kind == _UBX_ERROR:
+                handler.onUBXError(*event[1:])
+            else:
+                handler.onNMEAError(event[1])
+
+    def shutdown(self, timeout=1.0):
+        """Stop the workers."""
+        self._stop.set()
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self._running = set()
+
+
+def _noParse(e, payload):
+    return "No parse, \"{}\", payload={}".format(e, formatByteString(payload))
+
+
+class _Sink:
+    """Framer sink collecting the events of one read chunk."""
+
+    def __init__(self, decode, columnar):
+        self.decode = decode
+        self.columnar = columnar
+        self.events = []
+
+    def _onUBX(self, msgClass, msgId, buffer):
+        if not self.decode:
+            self.events.append((_FRAME, msgClass, msgId, bytes(buffer)))
+            return
+        try:
+            obj = parseUBXPayload(msgClass, msgId, buffer, self.columnar)
+        except Exception as e:
+            self.events.append(
+                (_UBX_ERROR, msgClass, msgId, _noParse(e, buffer))
+            )
+        else:
+            self.events.append((_UBX, detachMessage(obj)))
+
+    def _onUBXError(self, msgClass, msgId, errMsg):
+        """Checksum errors are dropped, as in UBXManager."""
+
+    def _onNMEA(self, buffer):
+        self.events.append((_NMEA, buffer))
+
+    def _onNMEAError(self, errMsg):
+        self.events.append((_NMEA_ERROR, errMsg))
+
+
+def _pump(sourceId, opener, q, stop, decode, columnar, chunkSize):
+    """Read, frame and forward one source until EOF or stop."""
+    sink = _Sink(decode, columnar)
+    framer = UBXFramer(sink)
+    stream = None
+    try:
+        stream = opener()
+        # a serial port returns no data on timeout, anything else on EOF
+        isPort = hasattr(stream, 'in_waiting')
+        while not stop.is_set():
+            if not readInto(framer, stream, chunkSize):
+                if isPort:
+                    continue
+                break
+            if sink.events:
+                q.put((sourceId, sink.events))
+                sink.events = []
+    except Exception as e:
+        sys.stderr.write("UBXHub source {!r}: {}\n".format(sourceId, e))
+    finally:
+        try:
+            if stream is not None:
+                stream.close()
+        finally:
+            q.put((sourceId, None))
+
+
+def _work(sources, q, stop, decode, columnar, chunkSize):
+    """Worker process: pump each of sources in its own thread."""
+    threads = [
+        threading.Thread(
+            target=_pump,
+            args=(sourceId, opener, q, stop, decode, columnar, chunkSize)
+        )
+        for sourceId, opener in sources
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
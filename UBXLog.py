@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""Batch access to the UBX frames in a recorded log file such as UBX.log."""
+
+import os
+import sys
+import mmap
+import struct
+from array import array
+from UBXMessage import UBXMessage, Columns, parseUBXPayload, numpy
+
+
+# Name, array.array typecode and NumPy dtype of the frame index arrays.
+_indexArrays = [
+    ('offsets', 'q', '<i8'),
+    ('classes', 'B', 'u1'),
+    ('ids', 'B', 'u1'),
+    ('lengths', 'H', '<u2'),
+    ('iTOW', 'I', '<u4'),
+]
+
+
+class UBXLog:
+    """A memory-mapped UBX log with an index of all valid UBX frames.
+
+    The frame index consists of the arrays offsets (position of the sync
+    chars), classes, ids, lengths (payload length) and iTOW (GPS time of
+    week in ms of NAV messages, noITOW for other messages). They are NumPy
+    arrays if NumPy is installed and array.array otherwise. NMEA sentences
+    and garbage between the frames are ignored.
+
+    The index is kept in a sidecar file next to the log (path + ".idx").
+    It is reused as long as the size and modification time of the log are
+    unchanged, and extended if the log has grown since.
+    """
+
+    chunkSize = 1 << 22     # bytes scanned at a time with NumPy
+    noITOW = 0xFFFFFFFF
+    _indexHeader = struct.Struct('<8sQqqQ')
+    _indexMagic = b'UBXIDX01'
+
+    def __init__(self, path, indexPath=None):
+        """Open and index the log file path.
+
+        indexPath is the name of the sidecar index file, it defaults to
+        path + ".idx". If it is False no sidecar file is used.
+        """
+        self.path = path
+        self.indexPath = path + ".idx" if indexPath is None else indexPath
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        except ValueError:      # empty file
+            self._mmap = None
+        self.data = memoryview(self._mmap if self._mmap is not None else b'')
+        for name, typecode, dtype in _indexArrays:
+            setattr(self, name, numpy.zeros(0, dtype=dtype)
+                    if numpy is not None else array(typecode))
+        self._scannedTo = 0
+        stat = os.fstat(self._file.fileno())
+        if not self.indexPath or not self._loadIndex(stat):
+            self._index(0)
+        elif self._scannedTo == stat.st_size:
+            return
+        else:
+            self._index(self._scannedTo)
+        if self.indexPath:
+            self._saveIndex(stat)
+
+    @classmethod
+    def open(cls, path, indexPath=None):
+        """Open and index the log file path."""
+        return cls(path, indexPath)
+
+    def close(self):
+        """Close the log file.
+
+        The file stays mapped as long as payloads or arrays returned by this
+        object reference it.
+        """
+        try:
+            self.data.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _index(self, start):
+        """Index the frames from offset start to the end of the file."""
+        if numpy is not None:
+            offsets = self._scanNumpy(start)
+            data = numpy.frombuffer(self.data, dtype=numpy.uint8)
+            lengths = data[offsets + 4].astype(numpy.uint16) | \
+                data[offsets + 5].astype(numpy.uint16) << 8
+            classes = data[offsets + 2]
+            iTOW = numpy.full(len(offsets), self.noITOW, dtype=numpy.uint32)
+            nav = numpy.flatnonzero((classes == 0x01) & (lengths >= 4))
+            iTOW[nav] = data[offsets[nav][:, None] + numpy.arange(6, 10)]\
+                .copy().view('<u4').reshape(len(nav))
+            new = [offsets, classes, data[offsets + 3], lengths, iTOW]
+            for (name, _, _), arr in zip(_indexArrays, new):
+                setattr(self, name, numpy.concatenate([getattr(self, name),
+                                                       arr]))
+        else:
+            offsets = self._scanPython(start)
+            data = self.data
+            self.offsets.extend(offsets)
+            self.classes.extend([data[i+2] for i in offsets])
+            self.ids.extend([data[i+3] for i in offsets])
+            lengths = [data[i+4] | data[i+5] << 8 for i in offsets]
+            self.lengths.extend(lengths)
+            self.iTOW.extend([
+                struct.unpack_from('<I', data, i + 6)[0]
+                if data[i+2] == 0x01 and length >= 4 else self.noITOW
+                for i, length in zip(offsets, lengths)
+            ])
+        if len(self.offsets):
+            self._scannedTo = int(self.offsets[-1]) + 8 + \
+                int(self.lengths[-1])
+
+    def _loadIndex(self, stat):
+        """Load the sidecar index, return False if it is missing or stale.
+
+        The index is stale if the log is now shorter, or if it has the same
+        size but a different modification time, or if the last indexed frame
+        is no longer where it was.
+        """
+        try:
+            with open(self.indexPath, 'rb') as file:
+                magic, size, mtime, scannedTo, n = \
+                    self._indexHeader.unpack(
+                        file.read(self._indexHeader.size)
+                    )
+                if magic != self._indexMagic or size > stat.st_size or \
+                   (size == stat.st_size and mtime != stat.st_mtime_ns):
+                    return False
+                arrays = []
+                for name, typecode, dtype in _indexArrays:
+                    if numpy is not None:
+                        arr = numpy.frombuffer(
+                            file.read(n * numpy.dtype(dtype).itemsize),
+                            dtype=dtype
+                        )
+                    else:
+                        arr = array(typecode)
+                        arr.fromfile(file, n)
+                        if sys.byteorder == 'big':
+                            arr.byteswap()
+                    if len(arr) != n:
+                        return False
+                    arrays.append(arr)
+        except (OSError, EOFError, struct.error, ValueError):
+            return False
+        if n:
+            offset, length = int(arrays[0][-1]), int(arrays[3][-1])
+            frame = self.data[offset:offset+8+length]
+            if len(frame) != 8 + length or frame[:2] != b'\xb5\x62' or \
+               frame[-2] << 8 | frame[-1] != \
+               UBXMessage.Checksum(frame[2:-2]).get():
+                return False
+        for (name, _, _), arr in zip(_indexArrays, arrays):
+            setattr(self, name, arr)
+        self._scannedTo = scannedTo
+        return True
+
+    def _saveIndex(self, stat):
+        """Write the sidecar index. Failing to write it is not an error."""
+        header = self._indexHeader.pack(
+            self._indexMagic, stat.st_size, stat.st_mtime_ns,
+            self._scannedTo, len(self.offsets)
+        )
+        try:
+            with open(self.indexPath, 'wb') as file:
+                file.write(header)
+                for name, _, dtype in _indexArrays:
+                    arr = getattr(self, name)
+                    if numpy is not None:
+                        file.write(arr.astype(dtype, copy=False).tobytes())
+                    else:
+                        if sys.byteorder == 'big':
+                            arr = array(arr.typecode, arr)
+                            arr.byteswap()
+                        arr.tofile(file)
+        except OSError:
+            pass
+
+    def _scanPython(self, start):
+        """Return the offsets of all valid frames after start."""
+        data = self._mmap
+        n = len(self.data)
+        offsets = array('q')
+        i = -1 if data is None else data.find(b'\xb5\x62', start)
+        while i != -1 and i + 8 <= n:
+            end = i + 8 + (data[i+4] | data[i+5] << 8)
+            if end <= n and data[end-2] << 8 | data[end-1] == \
+               UBXMessage.Checksum(data[i+2:end-2]).get():
+                offsets.append(i)
+                i = data.find(b'\xb5\x62', end)
+            else:
+                i = data.find(b'\xb5\x62', i + 1)
+        return offsets
+
+    def _scanNumpy(self, start):
+        """Return the offsets of all valid frames after start.
+
+        All sync positions of a chunk are located at once, their lengths and
+        Fletcher checksums are evaluated in bulk. Candidates inside an earlier
+        valid frame are discarded.
+        """
+        data = numpy.frombuffer(self.data, dtype=numpy.uint8)
+        n = len(data)
+        result = []
+        lastEnd = start
+        for chunkStart in range(start, n, self.chunkSize):
+            chunkStop = min(chunkStart + self.chunkSize + 1, n)
+            seg = data[chunkStart:chunkStop]
+            cand = numpy.flatnonzero((seg[:-1] == 0xb5) & (seg[1:] == 0x62))
+            cand = cand.astype(numpy.int64) + chunkStart
+            cand = cand[(cand >= lastEnd) & (cand + 8 <= n)]
+            if len(cand) == 0:
+                continue
+            ends = cand + 8 + (data[cand+4].astype(numpy.int64) |
+                               data[cand+5].astype(numpy.int64) << 8)
+            inside = ends <= n
+            cand, ends = cand[inside], ends[inside]
+            if len(cand) == 0:
+                continue
+            ok = UBXMessage.Checksum.many(data, cand + 2, ends - 2) == \
+                (data[ends-2].astype(numpy.uint16) << 8 | data[ends-1])
+            cand, ends = cand[ok], ends[ok]
+            if len(cand) == 0:
+                continue
+            if len(cand) > 1 and numpy.any(cand[1:] < ends[:-1]):
+                keep = []
+                for i, (c, e) in enumerate(zip(cand.tolist(),
+                                               ends.tolist())):
+                    if c >= lastEnd:
+                        keep.append(i)
+                        lastEnd = e
+                cand = cand[keep]
+            else:
+                lastEnd = int(ends[-1])
+            result.append(cand)
+        if not result:
+            return numpy.zeros(0, dtype=numpy.int64)
+        return numpy.concatenate(result)
+
+    def select(self, *msgClss, iTOW=None):
+        """Return the indices of the frames of the given message classes.
+
+        msgClss are message classes such as UBX.NAV.SAT. Without arguments
+        all frames are selected. If iTOW is a tuple (a, b) only NAV frames
+        with a <= iTOW <= b are selected. For example the 10,000th RAWX
+        frame is log.message(log.select(UBX.RXM.RAWX)[9999]).
+        """
+        if numpy is not None:
+            if not msgClss:
+                mask = numpy.ones(len(self.offsets), dtype=bool)
+            else:
+                mask = numpy.zeros(len(self.offsets), dtype=bool)
+                for msgCls in msgClss:
+                    mask |= (self.classes == msgCls._class) & \
+                            (self.ids == msgCls._id)
+            if iTOW is not None:
+                mask &= (self.iTOW >= iTOW[0]) & (self.iTOW <= iTOW[1]) & \
+                        (self.iTOW != self.noITOW)
+            return numpy.flatnonzero(mask)
+        keys = set((msgCls._class, msgCls._id) for msgCls in msgClss)
+        return array('q', [
+            i for i, key in enumerate(zip(self.classes, self.ids))
+            if (not keys or key in keys) and
+            (iTOW is None or (iTOW[0] <= self.iTOW[i] <= iTOW[1] and
+                              self.iTOW[i] != self.noITOW))
+        ])
+
+    def payload(self, i):
+        """Return the payload of frame i as a memoryview."""
+        offset = int(self.offsets[i])
+        return self.data[offset+6:offset+6+int(self.lengths[i])]
+
+    def frame(self, i):
+        """Return the complete frame i as a memoryview."""
+        offset = int(self.offsets[i])
+        return self.data[offset:offset+8+int(self.lengths[i])]
+
+    def message(self, i, columnar=False, lazy=False):
+        """Return the parsed message of frame i.
+
+        Lazy messages reference the memory-mapped file instead of a copy of
+        the payload.
+        """
+        payload = self.payload(i)
+        return parseUBXPayload(
+            int(self.classes[i]), int(self.ids[i]),
+            payload if lazy else bytes(payload), columnar, lazy
+        )
+
+    def parse(self, *msgClss, columnar=False, lazy=False):
+        """Generate the parsed messages of the given message classes."""
+        for i in self.select(*msgClss):
+            yield self.message(i, columnar, lazy)
+
+    def _selectLayout(self, msgCls):
+        """Return the indices of the frames of msgCls that fit its layout."""
+        layout = msgCls._layout
+        sel = self.select(msgCls)
+        sizeOnce = layout.once.size
+        if layout.repeat is None:
+            return [i for i in sel if self.lengths[i] == sizeOnce] \
+                if numpy is None else sel[self.lengths[sel] == sizeOnce]
+        sizeRepeat = layout.repeat.size
+        if numpy is None:
+            return [i for i in sel if self.lengths[i] >= sizeOnce and
+                    (self.lengths[i] - sizeOnce) % sizeRepeat == 0]
+        lengths = self.lengths[sel].astype(numpy.int64)
+        return sel[(lengths >= sizeOnce) &
+                   ((lengths - sizeOnce) % sizeRepeat == 0)]
+
+    def columns(self, msgCls):
+        """Decode the fixed blocks of all msgCls frames column-wise.
+
+        Returns a NumPy structured array with one row per frame, or a
+        Columns object of array.array columns without NumPy. Frames whose
+        length does not fit the message layout are skipped.
+        """
+        layout = msgCls._layout
+        sel = self._selectLayout(msgCls)
+        size = layout.once.size
+        if numpy is not None:
+            data = numpy.frombuffer(self.data, dtype=numpy.uint8)
+            idx = self.offsets[sel][:, None] + 6 + numpy.arange(size)
+            return data[idx].view(layout.onceDtype).reshape(len(sel))
+        rows = [layout.once.unpack_from(self.data, self.offsets[i] + 6)
+                for i in sel]
+        cols = list(zip(*rows)) if rows else [()] * len(layout.names)
+        return Columns(layout.names, [
+            array(t.fmt, col) if len(t.fmt) == 1 else list(col)
+            for t, col in zip(layout.types, cols)
+        ], len(rows))
+
+    def repeatedColumns(self, msgCls):
+        """Decode the repeated blocks of all msgCls frames column-wise.
+
+        Returns (frame, columns) where frame[k] is the number of the msgCls
+        frame (counting from 0 in the order of columns(msgCls)) that
+        repeated block k belongs to.
+        """
+        layout = msgCls._layout
+        sel = self._selectLayout(msgCls)
+        sizeOnce, sizeRepeat = layout.once.size, layout.repeat.size
+        if numpy is not None:
+            data = numpy.frombuffer(self.data, dtype=numpy.uint8)
+            counts = (self.lengths[sel].astype(numpy.int64) - sizeOnce) \
+                // sizeRepeat
+            frame = numpy.repeat(numpy.arange(len(sel)), counts)
+            first = numpy.cumsum(counts) - counts
+            starts = self.offsets[sel] + 6 + sizeOnce
+            rowStarts = numpy.repeat(starts, counts) + \
+                (numpy.arange(len(frame)) - numpy.repeat(first, counts)) \
+                * sizeRepeat
+            idx = rowStarts[:, None] + numpy.arange(sizeRepeat)
+            return frame, data[idx].view(layout.dtype).reshape(len(frame))
+        frame, rows = array('q'), []
+        for k, i in enumerate(sel):
+            offset = self.offsets[i] + 6
+            payload = self.data[offset:offset+self.lengths[i]]
+            blocks = list(layout.repeat.iter_unpack(payload[sizeOnce:]))
+            frame.extend([k] * len(blocks))
+            rows += blocks
+        cols = list(zip(*rows)) if rows else [()] * len(layout.repNames)
+        return frame, Columns(layout.repNames, [
+            array(t.fmt, col) if len(t.fmt) == 1 else list(col)
+            for t, col in zip(layout.repTypes, cols)
+        ], len(rows))
+
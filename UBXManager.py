@@ -1,205 +1,182 @@
 #!/usr/bin/env python3
 """TODO."""
 
+import concurrent.futures
 import threading
-from enum import Enum
 import sys
+from time import monotonic, perf_counter, sleep
+from collections import Counter
 
 
-class UBXManager(threading.Thread):
-    """The NMEA/UBX reader/writer thread."""
-
-    class STATE(Enum):
-        START = 0
-        NMEA_BODY = 1
-        NMEA_CHKSUM_1 = 2
-        NMEA_CHKSUM_2 = 3
-        UBX_SYNC_CHAR_2 = 4
-        UBX_CLASS = 5
-        UBX_ID = 6
-        UBX_LENGTH_1 = 7
-        UBX_LENGTH_2 = 8
-        UBX_PAYLOAD = 9
-        UBX_CHKSUM_1 = 10
-        UBX_CHKSUM_2 = 11
-
-    def __init__(self, ser, debug=False, log_file_name=None):
-        """Instantiate with serial."""
-        from UBXMessage import UBXMessage
-        threading.Thread.__init__(self)
-        self.ser = ser
-        self.debug = debug
-        self._shutDown = False
-        self.ubx_chksum = UBXMessage.Checksum()
-        self.log_file_name = log_file_name
-        self.log_file = None
+class UBXDispatcher:
+    """Framer sink shared by UBXManager and AsyncUBXManager.
 
-    def run(self):
-        """Run the parser."""
-        transitionFrom = [
-            self._fromSTART,
-            self._fromNMEA_BODY,
-            self._fromNMEA_CHKSUM_1,
-            self._fromNMEA_CHKSUM_2,
-            self._fromUBX_SYNC_CHAR_2,
-            self._fromUBX_CLASS,
-            self._fromUBX_ID,
-            self._fromUBX_LENGTH_1,
-            self._fromUBX_LENGTH_2,
-            self._fromUBX_PAYLOAD,
-            self._fromUBX_CHKSUM_1,
-            self._fromUBX_CHKSUM_2,
-        ]
-        if self.debug or self.log_file_name is not None:
-            log_file_name = "UBX.log" if self.log_file_name is None else self.log_file_name
-            self.log_file = open(log_file_name, "wb")
-            sys.stderr.write("Writing log to UBX.log\n")
-        self._reset()
+    It parses the frames, hands responses to the pending requests and the
+    other messages to the subscribers or onUBX and onNMEA, and keeps the
+    counters of stats().
+    """
 
-        while not self._shutDown:
-            byte = self.ser.read(1)
-
-            if self.log_file is not None:
-                self.log_file.write(byte)
-                if self.debug:
-                    self.log_file.flush()
-            self.state = transitionFrom[self.state.value](byte)
-
-    def _reset(self):
-        self.buffer = b''
-        self.chksum = 0
-        self.chksum_calc = 0
-        self.ubx_class = 0
-        self.ubx_id = 0
-        self.ubx_length = 0
-        self.state = UBXManager.STATE.START
-        self.ubx_chksum.reset()
-
-    def _fromSTART(self, byte):
-        if byte == b'$':
-            return UBXManager.STATE.NMEA_BODY
-        elif byte == b'\xb5':
-            return UBXManager.STATE.UBX_SYNC_CHAR_2
-        else:
-            return UBXManager.STATE.START
-
-    def _fromNMEA_BODY(self, byte):
-        if byte == b'*':
-            return UBXManager.STATE.NMEA_CHKSUM_1
-        else:
-            self.buffer += byte
-            self.chksum_calc ^= ord(byte)
-            return UBXManager.STATE.NMEA_BODY
-
-    def _fromNMEA_CHKSUM_1(self, byte):
-        try:
-            self.chksum = int(byte, 16) * 16
-        except ValueError:
-            return UBXManager.STATE.START
-        return UBXManager.STATE.NMEA_CHKSUM_2
+    def _initDispatcher(self, debug, columnar, lazy, stats):
+        from UBXRequests import RequestTable
+        self.debug = debug
+        self.columnar = columnar
+        self.lazy = lazy
+        # ({(msgClass, msgId or None): callbacks},
+        #  {(msgClass, msgId): callbacks}), replaced as a whole on change
+        self._subscriptions = ({}, {})
+        # {sentence type: callbacks}, replaced as a whole on change
+        self._nmeaSubscriptions = {}
+        # (msgClass, msgId) or NMEA sentence type -> unsubscribed frames
+        self.dropped = Counter()
+        self._requests = RequestTable()
+        self._stats = None
+        if stats:
+            from UBXStats import UBXStats
+            self._stats = UBXStats()
 
-    def _fromNMEA_CHKSUM_2(self, byte):
+    def _onNMEA(self, buffer):
+        if self._stats is not None:
+            self._stats.nmea += 1
+        subscriptions = self._nmeaSubscriptions
+        if not subscriptions:
+            self.onNMEA(buffer)
+            return
+        sentenceType = buffer[2:5]
+        callbacks = subscriptions.get(sentenceType)
+        if callbacks is None:
+            self.dropped[sentenceType] += 1
+            return
+        from NMEAMessage import parseNMEASentence
         try:
-            self.chksum += int(byte, 16)
-        except ValueError:
-            return UBXManager.STATE.START
-        if self.chksum == self.chksum_calc:
-            self._onNMEA(self.buffer.decode('ascii'))
-        else:
+            obj = parseNMEASentence(buffer)
+        except Exception as e:
             self._onNMEAError(
-                "Incorrect Checksum: {:02X} should be {:02X}"
-                .format(self.chksum_calc, self.chksum)
+                "No parse, \"{}\", sentence={}".format(e, buffer)
             )
-        self._reset()
-        return UBXManager.STATE.START
-
-    def _fromUBX_SYNC_CHAR_2(self, byte):
-        if byte == b'\x62':
-            return UBXManager.STATE.UBX_CLASS
-        else:
-            return UBXManager.STATE.START
-
-    def _fromUBX_CLASS(self, byte):
-        self.ubx_class = ord(byte)
-        self.ubx_chksum.update(byte)
-        return UBXManager.STATE.UBX_ID
-
-    def _fromUBX_ID(self, byte):
-        self.ubx_id = ord(byte)
-        self.ubx_chksum.update(byte)
-        return UBXManager.STATE.UBX_LENGTH_1
-
-    def _fromUBX_LENGTH_1(self, byte):
-        self.ubx_length = ord(byte)
-        self.ubx_chksum.update(byte)
-        return UBXManager.STATE.UBX_LENGTH_2
-
-    def _fromUBX_LENGTH_2(self, byte):
-        self.ubx_length = self.ubx_length + 256 * ord(byte)
-        self.ubx_chksum.update(byte)
-        return UBXManager.STATE.UBX_PAYLOAD
-
-    def _fromUBX_PAYLOAD(self, byte):
-        if self.ubx_length > 0:
-            self.buffer += byte
-            self.ubx_length -= 1
-            self.ubx_chksum.update(byte)
-            return UBXManager.STATE.UBX_PAYLOAD
-        else:
-            self.chksum = 256 * ord(byte)   # CK_A shifted left
-            return UBXManager.STATE.UBX_CHKSUM_1
-
-    def _fromUBX_CHKSUM_1(self, byte):
-        self.chksum += ord(byte)  # 256 * CK_A + CK_B
-        return UBXManager.STATE.UBX_CHKSUM_2
-
-    def _fromUBX_CHKSUM_2(self, byte):
-        if self.chksum == self.ubx_chksum.get():
-            self._onUBX(self.ubx_class, self.ubx_id, self.buffer)
-        else:
-            self._onUBXError(
-                self.ubx_class,
-                self.ubx_id,
-                "Incorrect Checksum: {:04X} should be {:04X}"
-                    .format(self.ubx_chksum.get(), self.chksum)
-            )
-        self._reset()
-        if self.log_file is not None:
-            self.log_file.flush()
-
-        if byte == b'$':
-            return UBXManager.STATE.NMEA_BODY
-        elif byte == b'\xb5':
-            return UBXManager.STATE.UBX_SYNC_CHAR_2
-        else:
-            return UBXManager.STATE.START
-
-    def _onNMEA(self, buffer):
-        self.onNMEA(buffer)
+            return
+        for callback in callbacks:
+            callback(obj)
 
     def onNMEA(self, buffer):
         """Default handler for good NMEA message."""
         print("NMEA: {}".format(buffer))
 
     def _onNMEAError(self, errMsg):
+        if self._stats is not None:
+            self._stats.nmeaErrors += 1
         self.onNMEAError(errMsg)
 
     def onNMEAError(self, errMsg):
         """Default handler for faulty NMEA message."""
         print("NMEA ERR: {}".format(errMsg))
 
+    def subscribe(self, msgCls, callback=None):
+        """Call callback(obj) for each received message of type msgCls.
+
+        msgCls is a message such as UBX.NAV.SAT, a message class such as
+        UBX.NAV (all its messages) or a tuple (msgClass, msgId) where msgId
+        may be None. callback defaults to onUBX.
+        As soon as there is a subscription, frames nobody subscribed to are
+        counted in self.dropped and discarded without being parsed.
+
+        msgCls may also be an NMEA sentence type such as NMEAMessage.GGA,
+        callback then gets the parsed sentence and defaults to onNMEA. NMEA
+        and UBX subscriptions are independent: as soon as there is an NMEA
+        subscription, other sentence types are dropped without decoding.
+        """
+        if _isSentence(msgCls):
+            subscriptions = dict(self._nmeaSubscriptions)
+            subscriptions[msgCls._type] = \
+                subscriptions.get(msgCls._type, ()) + \
+                (self.onNMEA if callback is None else callback,)
+            self._nmeaSubscriptions = subscriptions
+            return
+        key = _subscriptionKey(msgCls)
+        subscriptions = dict(self._subscriptions[0])
+        subscriptions[key] = subscriptions.get(key, ()) + \
+            (self.onUBX if callback is None else callback,)
+        self._subscriptions = (subscriptions, {})
+
+    def unsubscribe(self, msgCls, callback=None):
+        """Remove the subscription made with subscribe(msgCls, callback)."""
+        if _isSentence(msgCls):
+            callback = self.onNMEA if callback is None else callback
+            subscriptions = dict(self._nmeaSubscriptions)
+            callbacks = list(subscriptions.get(msgCls._type, ()))
+            callbacks.remove(callback)
+            if callbacks:
+                subscriptions[msgCls._type] = tuple(callbacks)
+            else:
+                del subscriptions[msgCls._type]
+            self._nmeaSubscriptions = subscriptions
+            return
+        key = _subscriptionKey(msgCls)
+        callback = self.onUBX if callback is None else callback
+        subscriptions = dict(self._subscriptions[0])
+        callbacks = list(subscriptions.get(key, ()))
+        callbacks.remove(callback)
+        if callbacks:
+            subscriptions[key] = tuple(callbacks)
+        else:
+            del subscriptions[key]
+        self._subscriptions = (subscriptions, {})
+
     def _onUBX(self, msgClass, msgId, buffer):
         from UBXMessage import parseUBXPayload, formatByteString
+        from UBXMessage import lookupMessage
+        stats = self._stats
+        if stats is not None:
+            stats.frames[(msgClass, msgId)] += 1
+        subscriptions, dispatch = self._subscriptions
+        pending = self._requests.isPending(msgClass, msgId)
+        if subscriptions:
+            key = (msgClass, msgId)
+            callbacks = dispatch.get(key)
+            if callbacks is None:
+                callbacks = subscriptions.get(key, ()) + \
+                    subscriptions.get((msgClass, None), ())
+                dispatch[key] = callbacks
+            if not callbacks and not pending:
+                self.dropped[key] += 1
+                return
+        else:
+            callbacks = None
+        if stats is not None:
+            t0 = perf_counter()
         try:
             if self.debug:
                 print('onUBX:{}:{}:{}'.format(msgClass,msgId,formatByteString(buffer)))
-            obj = parseUBXPayload(msgClass, msgId, buffer)
+            obj = parseUBXPayload(
+                msgClass, msgId, buffer, self.columnar, self.lazy
+            )
         except Exception as e:
+            if stats is not None:
+                if lookupMessage(msgClass, msgId) is None:
+                    stats.unknownMessages[(msgClass, msgId)] += 1
+                else:
+                    stats.parseErrors += 1
             errMsg = "No parse, \"{}\", payload={}".format(
                      e, formatByteString(buffer))
             self.onUBXError(msgClass, msgId, errMsg)
         else:
+            if stats is None:
+                self._dispatch(obj, pending, callbacks)
+            else:
+                t1 = perf_counter()
+                stats.parseTime.add(t1 - t0)
+                self._dispatch(obj, pending, callbacks)
+                stats.handlerTime.add(perf_counter() - t1)
+
+    def _dispatch(self, obj, pending, callbacks):
+        """Hand obj to a pending request, the subscribers or onUBX."""
+        from UBXMessage import detachMessage
+        if pending and self._requests.resolve(detachMessage(obj)):
+            return
+        if callbacks is None:
             self.onUBX(obj)
+            return
+        for callback in callbacks:
+            callback(obj)
 
     def onUBX(self, obj):
         """Default handler for good UBX message."""
@@ -207,19 +184,323 @@ class UBXManager(threading.Thread):
 
     def _onUBXError(self, msgClass, msgId, errMsg):
         """Handle an UBX error."""
+        if self._stats is not None:
+            self._stats.checksumErrors += 1
 
     def onUBXError(self, msgClass, msgId, errMsg):
         """Default handler for faulty or not yet defined UBX message."""
         print("UBX ERR {:02X}:{:02X} {}"
               .format(msgClass, msgId, errMsg))
 
-    def send(self, msg):
-        """Send message to ser."""
+
+class UBXManager(UBXDispatcher, threading.Thread):
+    """The NMEA/UBX reader/writer thread."""
+
+    chunkSize = 4096    # read size for streams without in_waiting
+
+    def __init__(self, ser, debug=False, log_file_name=None, columnar=False,
+                 lazy=False, ring=None, stats=False, statsInterval=None,
+                 writer=None, capture=None):
+        """Instantiate with serial.
+
+        If columnar is True repeated blocks are decoded column-wise, if lazy
+        is True variables are decoded on first access, see
+        UBXMessage.parseUBXPayload.
+        If ring is an UBXRing.UBXRing the reader only frames and puts the
+        frames into the ring, a separate handler thread parses them and
+        runs the callbacks. A slow handler then does not stall reading.
+        If stats is True counters and timings are kept, see stats(). With
+        statsInterval they are passed to onStats every statsInterval
+        seconds.
+        If writer is an UBXWriter.UBXWriter, send() only queues the message
+        and the writer thread writes it, coalesced and paced to the baud
+        rate.
+        The received bytes are written to capture, an UBXCapture.UBXCapture,
+        if given, otherwise with debug or log_file_name to log_file_name
+        (default UBX.log). With an UBXRecording.UBXRecorder as capture the
+        messages sent are recorded too. The capture is closed when run()
+        ends.
+        """
+        from UBXFramer import UBXFramer
+        threading.Thread.__init__(self)
+        self.ser = ser
+        self._initDispatcher(debug, columnar, lazy, stats)
+        self._shutDown = False
+        self.ring = ring
+        self._framer = UBXFramer(self if ring is None else _RingSink(ring))
+        self._handlerThread = None
+        self.statsInterval = statsInterval
+        self.writer = writer
+        self.log_file_name = log_file_name
+        self.capture = capture
+
+    def run(self):
+        """Run the parser."""
+        if self.capture is None and \
+           (self.debug or self.log_file_name is not None):
+            from UBXCapture import UBXCapture
+            log_file_name = "UBX.log" if self.log_file_name is None else self.log_file_name
+            self.capture = UBXCapture(log_file_name)
+            sys.stderr.write("Writing log to {}\n".format(log_file_name))
+        self._framer.reset()
+        if self.ring is not None:
+            self._handlerThread = threading.Thread(
+                target=self._drain, daemon=True
+            )
+            self._handlerThread.start()
+        if self.statsInterval is not None:
+            threading.Thread(target=self._dumpStats, daemon=True).start()
+
+        stats = self._stats
+        capture = self.capture
+        # recorded before the handlers run, so the time is when it was read
+        # and a response sent by a handler comes after it
+        onRead = None if capture is None else capture.write
+        try:
+            while not self._shutDown:
+                try:
+                    data = readInto(self._framer, self.ser, self.chunkSize,
+                                    onRead)
+                except OSError:
+                    if self._shutDown:  # the port was closed to stop reading
+                        break
+                    raise
+                if stats is not None:
+                    stats.bytesRead += len(data)
+        finally:
+            if capture is not None:
+                capture.close()
+
+    def stats(self):
+        """Return a snapshot of the counters as a dict.
+
+        bytesSkipped and resyncs (of the framer), dropped (unsubscribed
+        frames), pendingRequests and, with a ring, writer or capture, their
+        counters are always available. With stats=True there are also
+        bytesRead, frames (per (msgClass, msgId)), nmea, checksumErrors,
+        nmeaErrors, parseErrors, unknownMessages and the histograms
+        parseTime and handlerTime.
+        """
+        snapshot = {
+            'bytesSkipped': self._framer.bytesSkipped,
+            'resyncs': self._framer.resyncs,
+            'dropped': dict(self.dropped),
+            'pendingRequests': len(self._requests),
+        }
+        if self.ring is not None:
+            snapshot['ring'] = dict(self.ring.counters)
+            snapshot['ring']['highWater'] = self.ring.highWater
+        if self.writer is not None:
+            snapshot['writer'] = self.writer.stats()
+        if self.capture is not None:
+            snapshot['capture'] = dict(self.capture.counters)
+        if self._stats is not None:
+            snapshot.update(self._stats.snapshot())
+        return snapshot
+
+    def _dumpStats(self):
+        while not self._shutDown:
+            sleep(self.statsInterval)
+            self.onStats(self.stats())
+
+    def onStats(self, stats):
+        """Default handler for the periodic stats."""
+        sys.stderr.write("STATS: {}\n".format(stats))
+
+    def _drain(self):
+        """Handler thread: dispatch the frames of the ring until closed."""
+        ring = self.ring
+        while True:
+            frame = ring.get()
+            if frame is None:
+                return
+            kind, msgClass, msgId, data = frame
+            if kind == _RING_UBX:
+                self._onUBX(msgClass, msgId, data)
+            elif kind == _RING_NMEA:
+                self._onNMEA(data.decode('ascii'))
+            elif kind == _RING_UBX_ERROR:
+                self._onUBXError(msgClass, msgId, data.decode())
+            else:
+                self._onNMEAError(data.decode())
+
+    def send(self, msg, priority=False):
+        """Send message to ser.
+
+        With a writer the message is queued, priority messages are sent
+        before the others.
+        """
         from UBXMessage import formatByteString
         if self.debug:
             print("SEND: {}".format(formatByteString(msg)))
-        self.ser.write(msg)
+        if self.writer is None:
+            self.ser.write(msg)
+        else:
+            self.writer.write(msg, priority)
+        if self.capture is not None:
+            self.capture.record(msg, self.capture.TX)
+
+    def submit(self, msg):
+        """Send poll msg, return a Future for the response message.
+
+        The response is the next message with the class and ID of msg, the
+        Future raises an Exception if the receiver answers with a NAK. Any
+        number of requests can be submitted before waiting for them.
+        """
+        from UBXRequests import messageKey
+        future = self._requests.expect(*messageKey(msg))
+        self._sendMessage(msg)
+        return future
+
+    def submitAck(self, msg):
+        """Send msg, return a Future for True (ACK) or False (NAK)."""
+        from UBXRequests import messageKey
+        future = self._requests.expectAck(*messageKey(msg))
+        self._sendMessage(msg)
+        return future
+
+    def request(self, msg, timeout=None):
+        """Send poll msg and return the response, see submit.
+
+        Raises concurrent.futures.TimeoutError after timeout seconds.
+        """
+        return _result(self.submit(msg), timeout)
+
+    def requestAck(self, msg, timeout=None):
+        """Send msg and return True if it is ACKed, False if it is NAKed."""
+        return _result(self.submitAck(msg), timeout)
+
+    def configure(self, changes, timeout=1.0, retries=2, backoff=0.5):
+        """Apply changes to CFG messages in one pipelined transaction.
+
+        changes is a list of (msgCls, change) where change is a dict of
+        field values or a function modifying the polled message in place,
+        e.g. (UBX.CFG.RATE, {'measRate': 200}). All polls are sent back to
+        back, then all modified messages are set and the ACK/NAKs collected.
+        Each phase waits at most timeout seconds. Failed items are retried
+        up to retries times, the n-th retry after backoff * 2**(n-1)
+        seconds. Returns a list of UBXRequests.ConfigResult in the order of
+        changes.
+        """
+        from UBXRequests import ConfigResult, messageKey
+        results = [ConfigResult(msgCls) for msgCls, _ in changes]
+        todo = list(range(len(changes)))
+        for attempt in range(retries + 1):
+            if not todo:
+                break
+            if attempt:
+                sleep(backoff * 2 ** (attempt - 1))
+            # 1. poll the items not yet polled, CFG polls are ACKed, too
+            polls = {}
+            for i in todo:
+                results[i].attempts += 1
+                if results[i].obj is None:
+                    msg = changes[i][0].Get()
+                    key = messageKey(msg)
+                    polls[i] = (self._requests.expect(*key),
+                                self._requests.expectAck(*key))
+                    self._sendMessage(msg)
+            deadline = monotonic() + timeout
+            for i, (response, ack) in polls.items():
+                try:
+                    if not _result(ack, max(0, deadline - monotonic())):
+                        raise Exception("Poll was NAKed")
+                    obj = _result(response, max(0, deadline - monotonic()))
+                    change = changes[i][1]
+                    if callable(change):
+                        change(obj)
+                    else:
+                        for name, value in change.items():
+                            setattr(obj, name, value)
+                    results[i].obj = obj
+                except Exception as e:
+                    response.cancel()
+                    ack.cancel()
+                    results[i].error = _errorMessage(e)
+            # 2. set the modified messages
+            sets = dict((i, self.submitAck(results[i].obj))
+                        for i in todo if results[i].obj is not None)
+            deadline = monotonic() + timeout
+            for i, ack in sets.items():
+                try:
+                    results[i].ok = _result(ack, max(0, deadline - monotonic()))
+                    results[i].error = None if results[i].ok else "Set was NAKed"
+                except Exception as e:
+                    results[i].error = _errorMessage(e)
+            todo = [i for i in todo if not results[i].ok]
+        return results
+
+    def _sendMessage(self, msg):
+        if not isinstance(msg, (bytes, bytearray)):
+            msg = msg.serialize()
+        self.send(msg)
 
     def shutdown(self):
         """Stop the manger."""
         self._shutDown = True
+        self._requests.cancelAll()
+        if self.ring is not None:
+            self.ring.close()
+        if self.writer is not None:
+            self.writer.close()
+
+
+_RING_UBX, _RING_UBX_ERROR, _RING_NMEA, _RING_NMEA_ERROR = range(4)
+
+
+class _RingSink:
+    """Framer sink putting the frames into an UBXRing."""
+
+    def __init__(self, ring):
+        self.ring = ring
+
+    def _onUBX(self, msgClass, msgId, buffer):
+        self.ring.put(_RING_UBX, msgClass, msgId, buffer)
+
+    def _onUBXError(self, msgClass, msgId, errMsg):
+        self.ring.put(_RING_UBX_ERROR, msgClass, msgId, errMsg.encode())
+
+    def _onNMEA(self, buffer):
+        self.ring.put(_RING_NMEA, 0, 0, buffer.encode('ascii'))
+
+    def _onNMEAError(self, errMsg):
+        self.ring.put(_RING_NMEA_ERROR, 0, 0, errMsg.encode())
+
+
+def readInto(framer, ser, chunkSize, onRead=None):
+    """Read what ser has buffered into framer, at least one byte.
+
+    ser is a serial port (in_waiting, then at most what it has buffered
+    is read) or any stream (at most chunkSize bytes). Returns a memoryview
+    of the bytes read, see UBXFramer.readFrom also for onRead.
+    """
+    inWaiting = getattr(ser, 'in_waiting', None)
+    size = chunkSize if inWaiting is None else (inWaiting or 1)
+    return framer.readFrom(ser, size, onRead)
+
+
+def _result(future, timeout):
+    """Return the result of future, cancel it on timeout."""
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:   # not TimeoutError before 3.11
+        future.cancel()
+        raise
+
+
+def _errorMessage(e):
+    """Return a description of exception e."""
+    return str(e) or type(e).__name__
+
+
+def _isSentence(msgCls):
+    """Return True if msgCls is an NMEA sentence type."""
+    from NMEAMessage import NMEASentence
+    return isinstance(msgCls, type) and issubclass(msgCls, NMEASentence)
+
+
+def _subscriptionKey(msgCls):
+    """Return the dispatch key (msgClass, msgId or None) of msgCls."""
+    if isinstance(msgCls, tuple):
+        return msgCls
+    return (msgCls._class, getattr(msgCls, '_id', None))
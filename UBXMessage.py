@@ -3,8 +3,15 @@
 
 import struct
 import inspect
+from array import array
+from itertools import chain, accumulate
+from operator import attrgetter
 from enum import Enum
 import sys
+try:
+    import numpy
+except ImportError:     # columnar decoding falls back to array.array
+    numpy = None
 
 
 class MessageClass(Enum):
@@ -23,9 +30,21 @@ class MessageClass(Enum):
     HNR = b'\x28'  # High Rate Navigation Results Messages: High rate time, position, speed, heading
 
 
-def _byte(i):
-    """Helper function: convert int 0..255 to bytestring byte."""
-    return bytes([i])
+# sync chars, class, id and length of a frame
+_frameHeader = struct.Struct('<BBBBH')
+
+
+def _checksum(msg):
+    """Return the two checksum bytes of the frame msg (without them).
+
+    Long frames are summed with NumPy if available.
+    """
+    if numpy is not None and len(msg) > 256:
+        s = numpy.frombuffer(msg, dtype=numpy.uint8, offset=2) \
+            .cumsum(dtype=numpy.uint64)
+        return bytes((int(s[-1]) & 0xff, int(s.sum()) & 0xff))
+    data = msg[2:]
+    return bytes((sum(data) & 0xff, sum(accumulate(data)) & 0xff))
 
 
 class UBXMessage(object):
@@ -46,12 +65,41 @@ class UBXMessage(object):
     @staticmethod
     def make(msgClass, msgId, payload):
         """Return a proper UBX message from the given class, id and payload."""
-        msg = struct.pack('cc', UBXMessage.sync_char_1, UBXMessage.sync_char_2)
-        msg += struct.pack('cc', _byte(msgClass), _byte(msgId))
-        msg += struct.pack('<h', len(payload))
-        msg += payload
-        msg += struct.pack('>H', UBXMessage.Checksum(msg[2:]).get())
-        return msg
+        msg = _frameHeader.pack(
+            0xb5, 0x62, msgClass, msgId, len(payload)
+        ) + payload
+        return msg + _checksum(msg)
+
+    @staticmethod
+    def makeMany(messages):
+        """Return the frames of many (msgClass, msgId, payload) as one bytes.
+
+        The frames are packed into one preallocated buffer, with NumPy all
+        checksums are computed at once, see Checksum.many.
+        """
+        messages = list(messages)
+        buf = bytearray(sum(len(payload) + 8 for _, _, payload in messages))
+        starts, offset = [], 0
+        for msgClass, msgId, payload in messages:
+            n = len(payload)
+            _frameHeader.pack_into(
+                buf, offset, 0xb5, 0x62, msgClass, msgId, n
+            )
+            buf[offset+6:offset+6+n] = payload
+            starts.append(offset)
+            offset += n + 8
+        if numpy is not None and messages:
+            data = numpy.frombuffer(buf, dtype=numpy.uint8)
+            starts = numpy.array(starts)
+            stops = numpy.append(starts[1:], len(buf)) - 2
+            checksums = UBXMessage.Checksum.many(data, starts + 2, stops)
+            data[stops] = checksums >> 8
+            data[stops + 1] = checksums & 0xff
+            del data
+        else:
+            for start, stop in zip(starts, starts[1:] + [len(buf)]):
+                buf[stop-2:stop] = _checksum(bytes(buf[start:stop-2]))
+        return bytes(buf)
 
     @staticmethod
     def extract(msg):
@@ -89,25 +137,48 @@ class UBXMessage(object):
             """
             self.reset()
             if msg is not None:
-                for i in msg:
-                    self.update(bytes([i]))
+                self.update(msg)
 
         def reset(self):
             """Reset the checksums to zero."""
             self.a, self.b = 0x00, 0x00
 
-        def update(self, byte):
-            """Update checksums with byte."""
-            i = ord(byte)
-            self.a += i
-            self.a &= 0xff
-            self.b += self.a
-            self.b &= 0xff
+        def update(self, data):
+            """Update checksums with data.
+
+            data is a single byte or a whole bytes/bytearray/memoryview.
+            After n bytes x_1..x_n the sums are a + x_1 + ... + x_n and
+            b + n*a + (prefix sums of x), both computed by C-level loops.
+            """
+            self.b = (self.b + len(data) * self.a + sum(accumulate(data))) \
+                & 0xff
+            self.a = (self.a + sum(data)) & 0xff
 
         def get(self):
             """Return the checksum (a 16-bit integer, ck_a is the MSB)."""
             return self.a * 256 + self.b
 
+        @staticmethod
+        def many(data, starts, stops):
+            """Return the checksums of many frames at once (needs NumPy).
+
+            data is a uint8 NumPy array, checksum k runs over
+            data[starts[k]:stops[k]]. Both Fletcher sums are obtained from
+            two cumulative sums over the covered window; uint64 overflow is
+            harmless as 2**64 is a multiple of 256. Returns a uint16 array
+            with ck_a in the MSB, like get().
+            """
+            lo, hi = int(starts.min()), int(stops.max())
+            s1 = numpy.zeros(hi - lo + 1, dtype=numpy.uint64)
+            numpy.cumsum(data[lo:hi], dtype=numpy.uint64, out=s1[1:])
+            s2 = numpy.zeros(hi - lo + 2, dtype=numpy.uint64)
+            numpy.cumsum(s1, dtype=numpy.uint64, out=s2[1:])
+            p, q = starts - lo, stops - lo
+            a = (s1[q] - s1[p]) & 0xff
+            b = (s2[q+1] - s2[p+1] - (q - p).astype(numpy.uint64) * s1[p]) \
+                & 0xff
+            return (a << 8 | b).astype(numpy.uint16)
+
 
 def _mkFieldInfo(Fields):
     # The following is a list of (name, formatChar) tuples, such as
@@ -127,37 +198,333 @@ def _mkFieldInfo(Fields):
         }
 
 
-def _mkNamesAndTypes(fieldInfo, msgLength):
-    """Make list of variable names and list of variable types.
-
-    Input is the fieldInfo as returned by _mkFieldInfo.
-    The number of repeated objects is deduced from the message length and
-    the types of variables in the 'once' and 'repeat' block of the input."""
-    varTypes, varNames = fieldInfo['once']
-    repeat = fieldInfo['repeat']
-    if repeat:
-        varTypesRepeat, varNamesRepeat = repeat['once']     # nest level 1 only
-        sizeOnce = sum([t._size for t in varTypes])
-        sizeRepeat = sum([t._size for t in varTypesRepeat])
-        N = (msgLength - sizeOnce) // sizeRepeat
-        sizeTotal = sizeOnce + N * sizeRepeat
-        if sizeTotal != msgLength:
+# Maps struct format characters to NumPy type strings.
+_numpyTypes = {
+    'B': 'u1', 'b': 'i1', 'H': '<u2', 'h': '<i2',
+    'I': '<u4', 'i': '<i4', 'f': '<f4', 'd': '<f8',
+}
+
+
+def _mkDtype(names, types):
+    """Return the packed NumPy dtype of the variables names of types."""
+    return numpy.dtype([
+        (name, _numpyTypes.get(t.fmt) or 'S' + t.fmt[:-1])
+        for name, t in zip(names, types)
+    ])
+
+
+class Columns:
+    """Repeated blocks decoded column-wise, used when NumPy is missing.
+
+    Like a NumPy structured array columns[name] returns the column of
+    variable name, len(columns) is the number of blocks.
+    """
+
+    def __init__(self, names, columns, N):
+        """Instantiate from the variable names and their columns."""
+        self.names = tuple(names)
+        self._columns = dict(zip(names, columns))
+        self._N = N
+
+    def __getitem__(self, name):
+        return self._columns[name]
+
+    def __len__(self):
+        return self._N
+
+
+class _Layout:
+    """The compiled struct layout of the Fields of a UBX message.
+
+    The fixed block and the Repeated block are each compiled into a single
+    little-endian struct.Struct. The flattened variable names ("ext_1",
+    "ext_2", ...) and the structs used for packing are cached per repeat
+    count.
+    """
+
+    def __init__(self, Fields, clsName):
+        """Compile the layout of Fields, clsName is used in error messages."""
+        fieldInfo = _mkFieldInfo(Fields)
+        self.clsName = clsName
+        self.types, self.names = map(tuple, fieldInfo['once'])
+        repeat = fieldInfo['repeat']
+        self.repTypes, self.repNames = \
+            map(tuple, repeat['once'] if repeat else ([], []))
+        self.once = struct.Struct('<' + ''.join(t.fmt for t in self.types))
+        self.repeat = None if not repeat else \
+            struct.Struct('<' + ''.join(t.fmt for t in self.repTypes))
+        # (index, type) of the fields that need converting after unpacking
+        self.convert = [(i, t) for i, t in enumerate(self.types)
+                        if hasattr(t, 'decode')]
+        self.repConvert = [(i, t) for i, t in enumerate(self.repTypes)
+                           if hasattr(t, 'decode')]
+        self.repIndex = dict((name, i) for i, name in enumerate(self.repNames))
+        # maps the fixed block variable names to (struct, offset, type)
+        self.fields = {}
+        offset = 0
+        for name, t in zip(self.names, self.types):
+            self.fields[name] = (struct.Struct('<' + t.fmt), offset, t)
+            offset += t._size
+        self.assign = _mkAssign(self.names)
+        self.values = attrgetter(*self.names) if len(self.names) > 1 else \
+            lambda obj: tuple(getattr(obj, name) for name in self.names)
+        self._namesAndTypes = {}
+        self._packers = {}
+        self._dtype = None
+        self._onceDtype = None
+
+    def count(self, msgLength):
+        """Return the number of repeated blocks in a payload of msgLength."""
+        sizeOnce = self.once.size
+        if self.repeat is None:
+            if msgLength < sizeOnce:
+                raise Exception(
+                    "Message length {} is shorter than required {}"
+                    .format(msgLength, sizeOnce)
+                )
+            if msgLength > sizeOnce:
+                raise Exception(
+                    "Message not fully consumed while parsing a {}!"
+                    .format(self.clsName)
+                )
+            return 0
+        N = (msgLength - sizeOnce) // self.repeat.size
+        sizeTotal = sizeOnce + N * self.repeat.size
+        if N < 0 or sizeTotal != msgLength:
             errmsg = "message length {} does not match {}"\
                      .format(msgLength, sizeTotal)
             raise Exception(errmsg)
-        varTypes += N * varTypesRepeat
-        varNames += _flatten(list(
-            map(lambda i: list(map(lambda s: s+"_"+str(i),
-                                   varNamesRepeat)
-                              ),
-                range(1, N+1))
+        return N
+
+    def namesAndTypes(self, N):
+        """Return the tuples of variable names and types for N repeats."""
+        namesAndTypes = self._namesAndTypes.get(N)
+        if namesAndTypes is None:
+            names = self.names + tuple(
+                "{}_{}".format(name, i)
+                for i in range(1, N+1) for name in self.repNames
+            )
+            if not names:
+                errmsg = 'No variables found in {}.'.format(self.clsName)
+                errmsg += ' Is the \'Fields\' class empty?'
+                raise Exception(errmsg)
+            namesAndTypes = (names, self.types + N * self.repTypes)
+            self._namesAndTypes[N] = namesAndTypes
+        return namesAndTypes
+
+    def packer(self, N):
+        """Return the struct.Struct packing a payload with N repeats."""
+        packer = self._packers.get(N)
+        if packer is None:
+            packer = struct.Struct(
+                self.once.format + N * self.repeat.format[1:]
+                if N else self.once.format
             )
-        )
-    return varNames, varTypes
+            self._packers[N] = packer
+        return packer
+
+    def decode(self, msg):
+        """Return the variable names and values decoded from payload msg."""
+        N = self.count(len(msg))
+        names, _ = self.namesAndTypes(N)
+        values, rep = self.decodeBlocks(msg, N)
+        return names, list(values) + rep
 
+    def decodeBlocks(self, msg, N):
+        """Return the values of the fixed block and of the N repeated blocks.
 
-def _flatten(l):
-    return [item for sublist in l for item in sublist]
+        The values of the repeated blocks are returned as one flat list in
+        the order of the flattened variables ("svId_1", "gnssId_1", ...).
+        """
+        values = self.decodeOnce(msg)
+        if not N:
+            return values, []
+        rep = list(chain.from_iterable(
+            self.repeat.iter_unpack(memoryview(msg)[self.once.size:])
+        ))
+        m = len(self.repTypes)
+        for i, t in self.repConvert:
+            for j in range(i, len(rep), m):
+                rep[j] = t.decode(rep[j])
+        return values, rep
+
+    def decodeOnce(self, msg):
+        """Return the values of the fixed block decoded from payload msg."""
+        values = self.once.unpack_from(msg)
+        if self.convert:
+            values = list(values)
+            for i, t in self.convert:
+                values[i] = t.decode(values[i])
+        return values
+
+    def decodeField(self, msg, name):
+        """Decode the single variable name from payload msg.
+
+        Raises AttributeError if there is no such variable in msg.
+        """
+        field = self.fields.get(name)
+        if field is None:
+            return self.decodeRepeated(msg, name)
+        fieldStruct, offset, t = field
+        val = fieldStruct.unpack_from(msg, offset)[0]
+        return t.decode(val) if hasattr(t, 'decode') else val
+
+    def decodeRepeated(self, msg, name):
+        """Decode a flattened repeated variable such as "svId_3" from msg.
+
+        Raises AttributeError if there is no such variable in msg.
+        """
+        base, _, i = name.rpartition('_')
+        j = self.repIndex.get(base)
+        if j is None or not i.isdigit() or \
+           not 1 <= int(i) <= self.count(len(msg)):
+            raise AttributeError(name)
+        offset = self.once.size + (int(i) - 1) * self.repeat.size
+        val = self.repeat.unpack_from(msg, offset)[j]
+        t = self.repTypes[j]
+        return t.decode(val) if hasattr(t, 'decode') else val
+
+    def columns(self, msg, N):
+        """Return the N repeated blocks of payload msg column-wise.
+
+        With NumPy this is a structured array referencing msg, without NumPy
+        a Columns object holding one array.array (or list for strings) per
+        variable.
+        """
+        if numpy is not None:
+            return numpy.frombuffer(
+                msg, dtype=self.dtype, count=N, offset=self.once.size
+            )
+        rows = self.repeat.iter_unpack(memoryview(msg)[self.once.size:])
+        cols = list(zip(*rows)) if N else [()] * len(self.repNames)
+        return Columns(self.repNames, [
+            array(t.fmt, col) if len(t.fmt) == 1 else list(col)
+            for t, col in zip(self.repTypes, cols)
+        ], N)
+
+    @property
+    def dtype(self):
+        """The NumPy dtype of one repeated block."""
+        if self._dtype is None:
+            self._dtype = _mkDtype(self.repNames, self.repTypes)
+        return self._dtype
+
+    @property
+    def onceDtype(self):
+        """The NumPy dtype of the fixed block."""
+        if self._onceDtype is None:
+            self._onceDtype = _mkDtype(self.names, self.types)
+        return self._onceDtype
+
+    def encode(self, values, N):
+        """Return the payload packed from the flattened values."""
+        if self.convert or self.repConvert:
+            _, types = self.namesAndTypes(N)
+            values = [t.encode(v) if hasattr(t, 'encode') else v
+                      for v, t in zip(values, types)]
+        return self.packer(N).pack(*values)
+
+
+def _mkAssign(names):
+    """Return a function assigning a sequence of values to obj.names.
+
+    It is compiled like the __init__ of a namedtuple: one unpacking
+    assignment is much faster than a setattr per variable.
+    """
+    if not names:
+        return lambda obj, values: None
+    ns = {}
+    exec("def assign(obj, values):\n    {}, = values\n".format(
+        ", ".join("obj." + name for name in names)
+    ), ns)
+    return ns['assign']
+
+
+class _RepeatedField:
+    """Class-level accessor of a flattened repeated variable ("svId_3").
+
+    Eagerly decoded objects keep the values of their repeated blocks in the
+    flat list _rep and _payload None, lazy and columnar objects decode them
+    from the payload. Assigning one re-encodes the payload and columns of a
+    columnar object, so they stay in line with the flattened variables.
+    """
+
+    __slots__ = ('name', 'index')
+
+    def __init__(self, name, index):
+        self.name = name
+        self.index = index
+
+    def __get__(self, obj, objType=None):
+        if obj is None:
+            return self
+        try:
+            return obj._rep[self.index]
+        except (AttributeError, IndexError):
+            return obj.__getattr__(self.name)
+
+    def __set__(self, obj, value):
+        try:
+            rep = obj._rep
+        except AttributeError:      # lazy or columnar: decode them all
+            layout = obj._layout
+            _, rep = layout.decodeBlocks(
+                obj._payload, layout.count(obj._len)
+            )
+            obj._rep = rep
+        if self.index >= len(rep):
+            raise AttributeError(self.name)
+        try:
+            columns = object.__getattribute__(obj, obj._repeatedName)
+        except AttributeError:
+            columns = None
+        if columns is None:
+            rep[self.index] = value
+            return
+        layout = obj._layout
+        N = layout.count(obj._len)
+        values = list(rep)
+        values[self.index] = value
+        payload = layout.encode(list(layout.values(obj)) + values, N)
+        rep[self.index] = value
+        obj._payload = payload
+        setattr(obj, obj._repeatedName, layout.columns(payload, N))
+
+
+def _addRepeatedFields(cls, N):
+    """Add the accessors of the variables of N repeated blocks to cls.
+
+    Eager, lazy and columnar parsing call it before the object is used,
+    so the accessors of a decoded object never depend on which objects
+    were decoded before.
+    """
+    layout = cls._layout
+    m = len(layout.repNames)
+    for k in range(cls._repeatCount, N):
+        for j, name in enumerate(layout.repNames):
+            flat = "{}_{}".format(name, k + 1)
+            if flat not in layout.fields:
+                setattr(cls, flat, _RepeatedField(flat, k * m + j))
+    cls._repeatCount = N
+
+
+def _mkSlotted(sc, layout):
+    """Return a copy of message class sc with __slots__.
+
+    The variables of the fixed block are slots, those of the repeated
+    blocks are kept in the flat list _rep. __dict__ stays available for
+    other attributes but is not created unless used.
+    """
+    slots = layout.names + ('_len', '_payload', '__dict__')
+    if layout.repeat is not None:
+        slots += ('_rep', sc.__dict__.get('_repeatedName') or 'repeated')
+    ns = dict(
+        (k, v) for k, v in sc.__dict__.items()
+        if k not in ('__dict__', '__weakref__')
+    )
+    ns['__slots__'] = slots
+    ns['__qualname__'] = sc.__qualname__
+    return type(sc)(sc.__name__, sc.__bases__, ns)
 
 
 def initMessageClass(cls):
@@ -170,49 +537,97 @@ def initMessageClass(cls):
     - add a __str__ if it doesn't exist
     Function __init__ instantiates the object from a message.
     Function __str__ creates a human readable string from the object.
+    Subclasses without __slots__ are replaced by a copy with __slots__, see
+    _mkSlotted, which saves most of the memory of each decoded message.
     """
     cls_name = cls.__name__
-    subClasses = [c for c in cls.__dict__.values() if type(c) == type]
+    subClasses = {}
+    for name, c in list(cls.__dict__.items()):
+        if type(c) != type:
+            continue
+        if c.__dict__.get('Fields') is None:        # 'Fields' must be present
+            raise Exception(
+                "Class {}.{} has no Fields"
+                .format(cls.__name__, c.__name__)
+            )
+        sc = subClasses.get(c)
+        if sc is None:
+            layout = _Layout(
+                c.Fields, "UBX.{}.{}".format(cls_name, c.__name__)
+            )
+            sc = c if '__slots__' in c.__dict__ else _mkSlotted(c, layout)
+            sc._layout = layout
+            subClasses[c] = sc
+        setattr(cls, name, sc)
+    subClasses = list(subClasses.values())
 
     lookup = dict([(getattr(subcls, '_id'), subcls) for subcls in subClasses])
     setattr(cls, "_lookup", lookup)
+    _messageClasses[cls._class] = cls
 
     for sc in subClasses:
-        if sc.__dict__.get('Fields') is None:       # 'Fields' must be present
-            raise Exception(
-                "Class {}.{} has no Fields"
-                .format(cls.__name__, sc.__name__)
-            )
         # add __init__ to subclass if necessary
         if sc.__dict__.get('__init__') is None:
-            def __init__(self, msg):
-                """Instantiate object from message bytestring."""
-                fieldInfo = _mkFieldInfo(self.Fields)
-                varNames, varTypes = _mkNamesAndTypes(fieldInfo, len(msg))
-                if not varNames:
-                    errmsg = 'No variables found in UBX.{}.{}.'\
-                             .format(cls_name, sc.__name__)
-                    errmsg += ' Is the \'Fields\' class empty?'
-                    raise Exception(errmsg)
-                _len = len(msg)     # msg will be consumed in the loop
-                for (varName, varType) in zip(varNames, varTypes):
-                    val, msg = varType.parse(msg)
-                    setattr(self, varName, val)
-                if len(msg) != 0:
-                    clsName = "UBX.{}.{}".format(cls_name, sc.__name__)
-                    raise Exception(
-                        "Message not fully consumed while parsing a {}!"
-                        .format(clsName)
-                    )
-                self._len = _len
-                self._payload = msg
+            if sc._layout.repeat is None:
+                def __init__(self, msg):
+                    """Instantiate object from message bytestring."""
+                    layout = self._layout
+                    layout.count(len(msg))
+                    layout.assign(self, layout.decodeOnce(msg))
+                    self._len = len(msg)
+                    self._payload = None
+            else:
+                def __init__(self, msg):
+                    """Instantiate object from message bytestring."""
+                    layout = self._layout
+                    N = layout.count(len(msg))
+                    values, self._rep = layout.decodeBlocks(msg, N)
+                    layout.assign(self, values)
+                    self._len = len(msg)
+                    self._payload = None
+                    if N > self._repeatCount:
+                        _addRepeatedFields(type(self), N)
+                sc._repeatCount = 0
             setattr(sc, "__init__", __init__)
+        # add __getattr__ to subclass if necessary
+        if sc.__dict__.get('__getattr__') is None:
+            def __getattr__(self, name):
+                """Decode variables of lazy and columnar objects on access.
+
+                Also adds the accessors of repeated variables to objects
+                that were not decoded by __init__, e.g. unpickled ones.
+                """
+                if name.startswith('_'):
+                    raise AttributeError(name)
+                layout = self._layout
+                payload = self._payload
+                if payload is not None:
+                    val = layout.decodeField(payload, name)
+                    if name in layout.fields:
+                        setattr(self, name, val)
+                    return val
+                if getattr(self, '_rep', None) is not None and \
+                   layout.count(self._len) > self._repeatCount:
+                    _addRepeatedFields(type(self), layout.count(self._len))
+                    return getattr(self, name)
+                raise AttributeError(name)
+            setattr(sc, "__getattr__", __getattr__)
+        # add __dir__ to subclass if necessary
+        if sc.__dict__.get('__dir__') is None:
+            def __dir__(self):
+                """List the variables, also the ones not decoded yet."""
+                layout = self._layout
+                names, _ = layout.namesAndTypes(layout.count(self._len))
+                return sorted(set(object.__dir__(self)).union(names))
+            setattr(sc, "__dir__", __dir__)
         # add __str__ to subclass if necessary
         if sc.__dict__.get('__str__') is None:
             def __str__(self):
                 """Return human readable string."""
-                fieldInfo = _mkFieldInfo(self.Fields)
-                varNames, varTypes = _mkNamesAndTypes(fieldInfo, self._len)
+                layout = self._layout
+                varNames, varTypes = layout.namesAndTypes(
+                    layout.count(self._len)
+                )
                 s = "{}-{}:".format(cls_name, type(self).__name__)
                 for (varName, varType) in zip(varNames, varTypes):
                     s += "\n  {}={}".format(
@@ -225,26 +640,103 @@ def initMessageClass(cls):
         if sc.__dict__.get('serialize') is None:
             def serialize(self):
                 """UBX-serialize this object."""
-                fieldInfo = _mkFieldInfo(self.Fields)
-                varNames, varTypes = _mkNamesAndTypes(fieldInfo, self._len)
-                payload = b''
-                for name, typ in zip(varNames, varTypes):
-                    val = getattr(self, name)
-                    payload += typ.serialize(val)
+                layout = self._layout
+                N = layout.count(self._len)
+                if self._payload is None and N:     # eagerly decoded
+                    values = list(layout.values(self)) + self._rep
+                elif self._payload is None:
+                    values = layout.values(self)
+                else:
+                    varNames, _ = layout.namesAndTypes(N)
+                    values = [getattr(self, name) for name in varNames]
+                payload = layout.encode(values, N)
                 return UBXMessage.make(
                     self._class, self._id, payload
                     )
             setattr(sc, "serialize", serialize)
+        # add detach to subclass if necessary
+        if sc.__dict__.get('detach') is None:
+            def detach(self):
+                """Copy the payload if it is a view of a reused buffer.
+
+                Lazy and columnar objects reference their payload. Parsed
+                from a memoryview (e.g. by UBXManager), they must be
+                detached before the next frame is read if they are kept.
+                Returns self.
+                """
+                payload = self._payload
+                if isinstance(payload, memoryview) and \
+                   not isinstance(payload.obj, bytes):
+                    payload = bytes(payload)
+                    self._payload = memoryview(payload)
+                    layout = self._layout
+                    name = self._repeatedName
+                    if layout.repeat is not None and \
+                       getattr(self, name, None) is not None:
+                        self._payload = payload
+                        setattr(self, name, layout.columns(
+                            payload, layout.count(len(payload))
+                        ))
+                return self
+            setattr(sc, "detach", detach)
         # set the '_class' class variable in subclass
         setattr(sc, '_class', cls._class)
+        # precompute the poll frame of addGet
+        Get = sc.__dict__.get('Get')
+        if Get is not None and '_frame' in Get.__dict__:
+            Get._class = cls._class
+            Get._frame = UBXMessage.make(cls._class, Get._id, b'')
+        if sc.__dict__.get('_repeatedName') is None:
+            setattr(sc, '_repeatedName', 'repeated')
+        registerMessage(sc)
     return cls
 
 
+# Maps (msgClass, msgId) to the python class that parses the message.
+_registry = {}
+# Maps msgClass to the python class representing the UBX message class.
+_messageClasses = {}
+
+
+def registerMessage(msgCls):
+    """Register the python class that parses a UBX message.
+
+    msgCls must have the class variables _class and _id and must be
+    instantiable from a payload bytestring or memoryview. If it keeps the
+    payload it should have a method detach, see detachMessage. A class
+    registered later for the same (_class, _id) replaces the earlier one.
+    Returns msgCls, so this can be used as a decorator. Classes in a message
+    class decorated with initMessageClass are registered automatically.
+    """
+    _registry[(msgCls._class, msgCls._id)] = msgCls
+    return msgCls
+
+
+def detachMessage(obj):
+    """Call obj.detach() if obj has such a method, return obj.
+
+    Message objects parsed from a memoryview may reference the reused read
+    buffer; detach copies what they reference.
+    """
+    detach = getattr(obj, 'detach', None)
+    if detach is not None:
+        detach()
+    return obj
+
+
+def lookupMessage(msgClass, msgId):
+    """Return the registered python class for msgClass, msgId or None."""
+    return _registry.get((msgClass, msgId))
+
+
 def classFromMessageClass():
     """Look up the python class corresponding to a UBX message class.
 
     The result is something like
     [(5, UBX.ACK.ACK), (6, UBX.CFG.CFG), (10, UBX.MON.MON)]
+
+    This inspects the UBX module on every call. It is not used for parsing
+    any more, see lookupMessage.
     """
     return dict([
         (getattr(v, '_class'), v)
@@ -256,25 +748,76 @@ def classFromMessageClass():
     ])
 
 
-def parseUBXPayload(msgClass, msgId, payload):
-    """Parse a UBX payload from message class, message ID and payload."""
-    Cls = classFromMessageClass().get(msgClass)
-    if Cls is None:
-        err = "Cannot parse message class {}.\n Available: {}"\
-              .format(msgClass, classFromMessageClass())
-        raise Exception(err)
-    Subcls = Cls._lookup.get(msgId)
+def _parseColumnar(Subcls, payload):
+    """Instantiate Subcls with the repeated blocks stored column-wise.
+
+    The columns are stored in the attribute named by the class variable
+    _repeatedName ("repeated" by default). The flattened variables such as
+    "svId_3" are still available, they are decoded from the payload on
+    access.
+    """
+    layout = Subcls.__dict__.get('_layout')
+    if layout is None or layout.repeat is None:
+        return Subcls(payload)
+    N = layout.count(len(payload))
+    if N > getattr(Subcls, '_repeatCount', N):   # see _addRepeatedFields
+        _addRepeatedFields(Subcls, N)
+    obj = Subcls.__new__(Subcls)
+    layout.assign(obj, layout.decodeOnce(payload))
+    obj._len = len(payload)
+    obj._payload = payload
+    setattr(obj, Subcls._repeatedName, layout.columns(payload, N))
+    return obj
+
+
+def _parseLazy(Subcls, payload):
+    """Instantiate Subcls without decoding any variables.
+
+    The object holds a memoryview of the payload, each variable is decoded
+    on first access and then cached. The payload length is checked
+    immediately, so errors are raised as for eagerly decoded objects.
+    """
+    layout = Subcls.__dict__.get('_layout')
+    if layout is None:
+        return Subcls(payload)
+    N = layout.count(len(payload))
+    layout.namesAndTypes(N)
+    if N > getattr(Subcls, '_repeatCount', N):   # see _addRepeatedFields
+        _addRepeatedFields(Subcls, N)
+    obj = Subcls.__new__(Subcls)
+    obj._len = len(payload)
+    obj._payload = memoryview(payload)
+    return obj
+
+
+def parseUBXPayload(msgClass, msgId, payload, columnar=False, lazy=False):
+    """Parse a UBX payload from message class, message ID and payload.
+
+    If columnar is True the repeated blocks are decoded column-wise, see
+    _parseColumnar. If lazy is True the variables are decoded on first
+    access, see _parseLazy; columnar is then ignored.
+    """
+    Subcls = _registry.get((msgClass, msgId))
     if Subcls is None:
+        Cls = _messageClasses.get(msgClass)
+        if Cls is None:
+            err = "Cannot parse message class {}.\n Available: {}"\
+                  .format(msgClass, _messageClasses)
+            raise Exception(err)
         raise Exception(
             "Cannot parse message ID {} of message class {}.\n Available: {}"
-            .format(msgId, msgClass.__name__, Cls._lookup))
+            .format(msgId, Cls.__name__, Cls._lookup))
+    if lazy:
+        return _parseLazy(Subcls, payload)
+    if columnar:
+        return _parseColumnar(Subcls, payload)
     return Subcls(payload)
 
 
-def parseUBXMessage(msg):
+def parseUBXMessage(msg, columnar=False, lazy=False):
     """Parse a UBX message."""
     msgClass, msgId, payload = UBXMessage.extract(msg)
-    return parseUBXPayload(msgClass, msgId, payload)
+    return parseUBXPayload(msgClass, msgId, payload, columnar, lazy)
 
 
 def formatByteString(s):
@@ -283,12 +826,20 @@ def formatByteString(s):
 
 
 def addGet(cls):
-    """Decorator that adds a Get function to the subclass."""
+    """Decorator that adds a Get function to the subclass.
+
+    The poll frame is built once by initMessageClass, serialize() returns
+    it.
+    """
     class Get(UBXMessage):
+        _id = cls._id
+        _frame = None       # set by initMessageClass
+
         def __init__(self):
-            # this only works because class and module have the same name!
-            import UBX
-            _class = eval(cls.__module__)._class
-            UBXMessage.__init__(self, _class, cls._id, b'')
+            UBXMessage.__init__(self, self._class, self._id, b'')
+
+        def serialize(self):
+            """Return the cached poll frame."""
+            return self._frame
     setattr(cls, "Get", Get)
     return cls
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Timestamped recordings of both directions of a receiver connection.
+
+A recording starts with MAGIC, followed by records of a header (host
+monotonic time in seconds as a double, direction RX or TX, source ID,
+length of the data) and the data. The reader can replay a recording with
+its original timing and convert it to and from the raw UBX.log format.
+"""
+
+import argparse
+import gzip
+import lzma
+import struct
+import sys
+from time import monotonic, sleep
+from UBXCapture import UBXCapture, _frameStart
+
+
+MAGIC = b'UBXREC01'
+RX, TX = UBXCapture.RX, UBXCapture.TX
+_header = struct.Struct('<dBxHI')   # time, direction, source, length
+
+
+class UBXRecorder(UBXCapture):
+    """Record what is received and sent, with host receive times.
+
+    record() takes the time and appends the record to the buffer, the
+    thread of UBXCapture writes it. UBXManager records each read as RX and
+    each send() as TX, so the records hold the host side timing; the time
+    of a TX record is when send() was called. write() records RX data.
+
+    source is the source ID of the records unless record() is given
+    another one, so several connections can share one recording.
+    Rotation and compression work as for UBXCapture (the default path is
+    UBX.rec), but segments are only started between the blocks the thread
+    writes, so that every segment starts with MAGIC and whole records.
+    self.counters also has the number of rx and tx records.
+    """
+
+    def __init__(self, path='UBX.rec', source=0, **kwargs):
+        """Instantiate, see UBXCapture for the other arguments."""
+        self.source = source
+        UBXCapture.__init__(self, path, **kwargs)
+
+    def write(self, data):
+        """Record data as received."""
+        self.record(data)
+
+    def record(self, data, direction=RX, source=None):
+        """Record data received or sent (direction TX) now."""
+        if source is None:
+            source = self.source
+        with self._cond:    # so the times are in order within the file
+            self._append(_header.pack(monotonic(), direction, source,
+                                      len(data)))
+            self._append(data)
+            self.counters['tx' if direction == TX else 'rx'] += 1
+
+    def _open(self):
+        UBXCapture._open(self)
+        self._file.write(MAGIC)
+
+    def _write(self, data):
+        """Write data, starting a new segment before it if due."""
+        if self._segmentBytes and self._rotationDue():
+            self._file.close()
+            self._open()
+        self._file.write(data)
+        self._segmentBytes += len(data)
+        self.counters['writes'] += 1
+
+
+def _openFile(path, mode):
+    """Open path, compressed according to its suffix."""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    if path.endswith('.xz'):
+        return lzma.open(path, mode)
+    return open(path, mode)
+
+
+def readRecords(path, chunkSize=1 << 20):
+    """Yield the records (time, direction, source, data) of a recording.
+
+    path may be compressed (".gz" or ".xz"). The file is read in chunks of
+    chunkSize bytes, each unpacked in one loop. A truncated last record,
+    as left by a crash, is ignored.
+    """
+    unpack, size = _header.unpack_from, _header.size
+    with _openFile(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise Exception("{} is not a recording".format(path))
+        data = b''
+        while True:
+            chunk = f.read(chunkSize)
+            if not chunk:
+                return
+            data = data + chunk if data else chunk
+            pos, n = 0, len(data)
+            while pos + size <= n:
+                t, direction, source, length = unpack(data, pos)
+                end = pos + size + length
+                if end > n:
+                    break
+                yield t, direction, source, data[pos+size:end]
+                pos = end
+            data = data[pos:]
+
+
+def replay(records, speed=1.0):
+    """Yield records at speed times their original pace.
+
+    With speed None they are yielded as fast as possible.
+    """
+    start = None
+    for record in records:
+        if speed:
+            if start is None:
+                start = record[0], monotonic()
+            delay = start[1] + (record[0] - start[0]) / speed - monotonic()
+            if delay > 0:
+                sleep(delay)
+        yield record
+
+
+class ReplayPort:
+    """Read-only serial port replaying the RX data of a recording.
+
+    UBXManager(ReplayPort("UBX.rec")) receives the data as it was
+    received when recording, at speed times the original pace (as fast as
+    possible with speed None). At the end self.eof is set and, like a
+    serial port with a timeout, read() waits timeout seconds and returns
+    b'', so the manager does not spin until it is shut down.
+    """
+
+    def __init__(self, path, speed=1.0, source=None, timeout=1.0):
+        """Instantiate, source None replays all sources."""
+        self._records = replay(
+            (r for r in readRecords(path) if r[1] == RX and
+             (source is None or r[2] == source)),
+            speed
+        )
+        self._data = b''
+        self.timeout = timeout
+        self.eof = False
+
+    def read(self, size=1):
+        """Return up to size bytes, waiting for the next record if needed."""
+        if not self._data:
+            record = next(self._records, None)
+            if record is None:
+                self.eof = True
+                sleep(self.timeout)
+                return b''
+            self._data = record[3]
+        data, self._data = self._data[:size], self._data[size:]
+        return data
+
+    def write(self, data):
+        """Discard data; what was sent is in the TX records."""
+        return len(data)
+
+
+def toRaw(src, dst, direction=RX, source=None):
+    """Write the data of the records of src in direction to the file dst.
+
+    With direction RX the result is a raw log like UBX.log. source None
+    takes all sources. Returns the number of bytes written.
+    """
+    n = 0
+    with _openFile(dst, 'wb') as f:
+        for t, d, s, data in readRecords(src):
+            if d == direction and (source is None or s == source):
+                f.write(data)
+                n += len(data)
+    return n
+
+
+def _frameEnd(data, pos):
+    """Return the end of the frame starting at pos, None if incomplete.
+
+    A UBX frame ends as its length field says, an NMEA sentence at the
+    end of the line. Other bytes are taken up to the next frame start.
+    """
+    if data.startswith(b'\xb5\x62', pos):
+        if pos + 6 > len(data):
+            return None
+        end = pos + 8 + int.from_bytes(data[pos+4:pos+6], 'little')
+    elif data.startswith(b'$', pos):
+        end = data.find(b'\n', pos) + 1 or len(data) + 1
+    else:
+        end = _frameStart(data, pos + 1)
+        if end == len(data):
+            end += 1    # the next frame start may follow
+    return end if end <= len(data) else None
+
+
+def fromRaw(src, dst, baudrate=None, source=0, chunkSize=1 << 20):
+    """Convert the raw log src to the recording dst, one RX record per frame.
+
+    A raw log has no times: with baudrate the time of a record is when its
+    last byte would have arrived at that rate (10 bits per byte),
+    otherwise all times are 0. Returns the number of records.
+    """
+    pack = _header.pack
+    count = offset = 0      # offset: bytes of src before data
+    with _openFile(src, 'rb') as f, _openFile(dst, 'wb') as out:
+        out.write(MAGIC)
+        data = b''
+        while True:
+            chunk = f.read(chunkSize)
+            data += chunk
+            parts, pos = [], 0
+            while pos < len(data):
+                end = _frameEnd(data, pos)
+                if end is None:
+                    if chunk:
+                        break   # the frame goes on in the next chunk
+                    end = len(data)
+                t = 10.0 * (offset + end) / baudrate if baudrate else 0.0
+                parts.append(pack(t, RX, source, end - pos))
+                parts.append(data[pos:end])
+                pos = end
+            out.write(b''.join(parts))
+            count += len(parts) // 2
+            offset += pos
+            data = data[pos:]
+            if not chunk:
+                return count
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+        )
+    parser.add_argument(
+        'command', choices=['toraw', 'fromraw'],
+        help='convert a recording to a raw log or a raw log to a recording'
+        )
+    parser.add_argument('src', help='file to convert')
+    parser.add_argument('dst', help='output file')
+    parser.add_argument(
+        '--tx', action='store_true',
+        help='toraw: write the TX instead of the RX data'
+        )
+    parser.add_argument(
+        '--source', type=int, default=None,
+        help='toraw: only this source, fromraw: the source ID (default 0)'
+        )
+    parser.add_argument(
+        '--baud', type=int, default=None,
+        help='fromraw: derive the times from this baud rate'
+        )
+    args = parser.parse_args()
+
+    if args.command == 'toraw':
+        n = toRaw(args.src, args.dst, TX if args.tx else RX, args.source)
+        sys.stderr.write("Wrote {} bytes.\n".format(n))
+    else:
+        n = fromRaw(args.src, args.dst, args.baud, args.source or 0)
+        sys.stderr.write("Wrote {} records.\n".format(n))
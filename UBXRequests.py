@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Correlate received UBX messages with pending requests."""
+
+from concurrent.futures import Future
+from threading import Lock
+
+
+_ACK_CLASS = 0x05
+_ACK_ID = 0x01
+
+
+def messageKey(msg):
+    """Return (msgClass, msgId) of a message object or serialized frame."""
+    if isinstance(msg, (bytes, bytearray)):
+        return (msg[2], msg[3])
+    return (msg._class, msg._id)
+
+
+class RequestTable:
+    """Pending requests keyed by the response they expect.
+
+    Polls wait for the next message with a given (msgClass, msgId), sets
+    wait for the ACK/NAK whose (clsID, msgID) match. Any number of
+    requests can be pending at once, requests with the same key complete
+    in the order they were made. Requests are concurrent.futures.Future
+    objects, a request that is cancelled (e.g. after a timeout) is removed
+    from the table.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._pending = {}      # (msgClass, msgId) -> [futures]
+        self._pendingAck = {}   # (clsID, msgID) -> [futures]
+
+    def __len__(self):
+        with self._lock:
+            return sum(map(len, self._pending.values())) + \
+                sum(map(len, self._pendingAck.values()))
+
+    def expect(self, msgClass, msgId):
+        """Return a future for the next message (msgClass, msgId).
+
+        The future raises an Exception if a NAK for the message arrives
+        first.
+        """
+        return self._add(self._pending, (msgClass, msgId))
+
+    def expectAck(self, clsID, msgID):
+        """Return a future for the ACK (True) or NAK (False) of a message."""
+        return self._add(self._pendingAck, (clsID, msgID))
+
+    def _add(self, pending, key):
+        future = Future()
+        with self._lock:
+            pending.setdefault(key, []).append(future)
+        future.add_done_callback(lambda f: self._discard(pending, key, f))
+        return future
+
+    def _discard(self, pending, key, future):
+        with self._lock:
+            futures = pending.get(key)
+            if futures is not None and future in futures:
+                futures.remove(future)
+                if not futures:
+                    del pending[key]
+
+    def _pop(self, pending, key):
+        """Remove and return the first pending future for key, if any."""
+        with self._lock:
+            futures = pending.get(key)
+            while futures:
+                future = futures.pop(0)
+                if not futures:
+                    del pending[key]
+                if future.set_running_or_notify_cancel():
+                    return future
+        return None
+
+    def isPending(self, msgClass, msgId):
+        """Return whether a message (msgClass, msgId) may complete a request.
+
+        This is meant as a quick check before parsing, it may return True
+        for ACK/NAKs that turn out not to be awaited.
+        """
+        if msgClass == _ACK_CLASS:
+            return bool(self._pendingAck or self._pending)
+        return (msgClass, msgId) in self._pending
+
+    def resolve(self, obj):
+        """Complete the request answered by obj, return True if there is one."""
+        if obj._class == _ACK_CLASS:
+            key = (obj.clsID, obj.msgID)
+            isACK = obj._id == _ACK_ID
+            future = self._pop(self._pendingAck, key)
+            if future is not None:
+                future.set_result(isACK)
+                return True
+            if not isACK:
+                future = self._pop(self._pending, key)
+                if future is not None:
+                    future.set_exception(Exception(
+                        "NAK for message {:02X}:{:02X}".format(*key)
+                    ))
+                    return True
+            return False
+        future = self._pop(self._pending, (obj._class, obj._id))
+        if future is None:
+            return False
+        future.set_result(obj)
+        return True
+
+    def cancelAll(self):
+        """Cancel all pending requests."""
+        with self._lock:
+            futures = [f for pending in (self._pending, self._pendingAck)
+                       for fs in pending.values() for f in fs]
+        for future in futures:
+            future.cancel()
+
+
+class ConfigResult:
+    """Outcome of one item of UBXManager.configure."""
+
+    def __init__(self, msgCls):
+        self.msgCls = msgCls
+        self.ok = False
+        self.attempts = 0
+        self.error = None   # why the last attempt failed
+        self.obj = None     # the modified message that was (to be) set
+
+    def __repr__(self):
+        return "<ConfigResult {} ok={} attempts={} error={}>".format(
+            self.msgCls.__qualname__, self.ok, self.attempts, self.error
+        )
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Bounded ring buffer of frames between a reader and a handler thread."""
+
+import threading
+from collections import Counter
+
+
+class UBXRing:
+    """Bounded FIFO of frames in preallocated bytearray slots.
+
+    Each entry is (kind, msgClass, msgId, data) with data copied into a
+    slot of slotSize bytes; larger frames get a slot of their own (counted
+    in self.counters['oversize']). When the ring is full put() applies the
+    policy:
+
+    DROP_OLDEST: overwrite the oldest frame
+    DROP_NEWEST: discard the frame being put
+    BLOCK: wait until the handler made room (backpressure on the reader)
+
+    Dropped frames are counted in self.counters['overruns'], waits of
+    BLOCK in self.counters['blocked'].
+    """
+
+    DROP_OLDEST = 'dropOldest'
+    DROP_NEWEST = 'dropNewest'
+    BLOCK = 'block'
+
+    def __init__(self, size=1024, slotSize=1024, policy=DROP_OLDEST):
+        """Instantiate with size slots of slotSize bytes each."""
+        if policy not in (self.DROP_OLDEST, self.DROP_NEWEST, self.BLOCK):
+            raise Exception("Unknown policy {!r}".format(policy))
+        self.size = size
+        self.slotSize = slotSize
+        self.policy = policy
+        self._slots = [bytearray(slotSize) for i in range(size)]
+        self._meta = [None] * size      # (kind, msgClass, msgId, length)
+        self._head = 0                  # next slot to get
+        self._count = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.counters = Counter()       # overruns, blocked, oversize
+        self.highWater = 0              # the most frames queued at once
+
+    def __len__(self):
+        return self._count
+
+    def put(self, kind, msgClass, msgId, data):
+        """Queue a frame, return False if it was dropped."""
+        n = len(data)
+        with self._cond:
+            if self._count == self.size:
+                if self.policy == self.DROP_NEWEST:
+                    self.counters['overruns'] += 1
+                    return False
+                if self.policy == self.DROP_OLDEST:
+                    self.counters['overruns'] += 1
+                    self._head = (self._head + 1) % self.size
+                    self._count -= 1
+                else:
+                    self.counters['blocked'] += 1
+                    while self._count == self.size and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        return False
+            i = (self._head + self._count) % self.size
+            slot = self._slots[i]
+            if n > len(slot):
+                self.counters['oversize'] += 1
+                slot = self._slots[i] = bytearray(n)
+            slot[:n] = data
+            self._meta[i] = (kind, msgClass, msgId, n)
+            self._count += 1
+            if self._count > self.highWater:
+                self.highWater = self._count
+            self._cond.notify_all()
+        return True
+
+    def get(self, timeout=None):
+        """Return the oldest frame (kind, msgClass, msgId, bytes).
+
+        Returns None if the ring is closed and empty or on timeout.
+        """
+        with self._cond:
+            if not self._cond.wait_for(
+                lambda: self._count or self._closed, timeout
+            ) or not self._count:
+                return None
+            i = self._head
+            slot = self._slots[i]
+            kind, msgClass, msgId, n = self._meta[i]
+            data = bytes(slot[:n])
+            if len(slot) > self.slotSize:   # give back oversized slots
+                self._slots[i] = bytearray(self.slotSize)
+            self._head = (i + 1) % self.size
+            self._count -= 1
+            self._cond.notify_all()
+        return kind, msgClass, msgId, data
+
+    def close(self):
+        """Wake up and release all waiting threads."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""A simulated u-blox receiver behind a pseudo-terminal or TCP socket."""
+
+import argparse
+import os
+import queue
+import random
+import select
+import socket
+import sys
+import threading
+import tty
+from collections import Counter
+from time import monotonic, sleep
+import UBX
+from UBXFramer import UBXFramer
+from UBXMessage import UBXMessage, parseUBXPayload
+
+
+class UBXSimulator:
+    """Virtual receiver for testing UBXManager without hardware.
+
+    It replays a recorded log (e.g. UBX.log of UBXManager) at speed times
+    real time, taking the epochs from the iTOW of the NAV messages, and
+    answers what the client sends: CFG polls with the current
+    configuration followed by an ACK, CFG sets with an ACK (NAK if the
+    payload does not parse), MON-VER polls with a version. Other polls of
+    unknown messages are NAKed.
+
+    The output can be throttled to baudrate (10 bits per byte), delayed
+    by up to jitter seconds per write and corrupted by flipping each byte
+    with probability corruption. What was sent is counted in
+    self.counters.
+    """
+
+    sliceSize = 256     # replay granularity, responses are sent in between
+
+    def __init__(self, logPath=None, speed=1.0, baudrate=None, jitter=0.0,
+                 corruption=0.0, loop=False, seed=None):
+        """Instantiate; logPath may be None to only answer requests."""
+        self.speed = speed
+        self.baudrate = baudrate
+        self.jitter = jitter
+        self.corruption = corruption
+        self.loop = loop
+        self.counters = Counter()
+        self.config = _defaultConfig()  # (msgClass, msgId) -> payload
+        self._random = random.Random(seed)
+        self._segments = _epochs(logPath) if logPath is not None else []
+        self._responses = queue.Queue()
+        self._framer = UBXFramer(self)
+        self._stop = threading.Event()
+        self._threads = []
+        self._fds = []
+        self._ptyPath = None
+        self._sentUntil = 0.0       # when the UART is done with the output
+
+    def openPty(self):
+        """Serve on a new pseudo-terminal, return the path of its slave."""
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        self._fds = [master, slave]     # keep the slave open
+        self._ptyPath = os.ttyname(slave)
+        self._start(master)
+        return self._ptyPath
+
+    def serveTCP(self, host='localhost', port=0):
+        """Serve the first client connecting to host:port, return the address.
+
+        With port 0 a free port is chosen.
+        """
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+        server.listen(1)
+        self._server = server
+        address = server.getsockname()
+
+        def accept():
+            while not self._stop.is_set():
+                if select.select([server], [], [], 0.1)[0]:
+                    conn, _ = server.accept()
+                    conn.setsockopt(
+                        socket.IPPROTO_TCP, socket.TCP_NODELAY, 1
+                    )
+                    self._conn = conn
+                    self._start(conn.fileno())
+                    return
+        thread = threading.Thread(target=accept, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return address
+
+    def _start(self, fd):
+        self._fd = fd
+        for target in (self._readLoop, self._writeLoop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop serving and close the pty or socket."""
+        self._stop.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(1.0)
+        for fd in self._fds:
+            os.close(fd)
+        self._fds = []
+        for name in ('_conn', '_server'):
+            sock = self.__dict__.pop(name, None)
+            if sock is not None:
+                sock.close()
+
+    def _readLoop(self):
+        """Read and answer the client's messages."""
+        while not self._stop.is_set():
+            if not select.select([self._fd], [], [], 0.1)[0]:
+                continue
+            try:
+                data = os.read(self._fd, 4096)
+            except OSError:
+                return
+            if not data:
+                return
+            self._framer.feed(data)
+
+    def _writeLoop(self):
+        """Replay the log, sending responses as soon as they are queued."""
+        while not self._stop.is_set():
+            start = monotonic()
+            for segment, seconds in self._segments:
+                due = start + seconds / self.speed
+                while not self._stop.is_set():
+                    remaining = due - monotonic()
+                    if remaining <= 0:
+                        break
+                    self._respond(remaining)
+                for i in range(0, len(segment), self.sliceSize):
+                    self._respond(0)
+                    self._write(segment[i:i+self.sliceSize])
+                    self.counters['replayBytes'] += \
+                        len(segment[i:i+self.sliceSize])
+                if self._stop.is_set():
+                    return
+            self.counters['replays'] += 1
+            if not (self.loop and self._segments):
+                break
+        while not self._stop.is_set():
+            self._respond(0.1)
+
+    def _respond(self, timeout):
+        """Send the queued responses, wait at most timeout for the first."""
+        try:
+            msg = self._responses.get(timeout=timeout) if timeout else \
+                self._responses.get_nowait()
+        except queue.Empty:
+            return
+        while True:
+            self._write(msg)
+            try:
+                msg = self._responses.get_nowait()
+            except queue.Empty:
+                return
+
+    def _write(self, data):
+        """Write data like a UART would: throttled, jittered, corrupted."""
+        if self.jitter:
+            sleep(self._random.uniform(0, self.jitter))
+        if self.corruption:
+            data = bytearray(data)
+            for i in range(len(data)):
+                if self._random.random() < self.corruption:
+                    data[i] ^= 1 << self._random.randrange(8)
+                    self.counters['corruptedBytes'] += 1
+        if self.baudrate:
+            now = monotonic()
+            self._sentUntil = max(self._sentUntil, now) + \
+                10.0 * len(data) / self.baudrate
+            if self._sentUntil > now:
+                sleep(self._sentUntil - now)
+        view = memoryview(data)
+        while view:
+            try:
+                n = os.write(self._fd, view)
+            except BlockingIOError:
+                select.select([], [self._fd], [], 0.1)
+                continue
+            except OSError:
+                self._stop.set()
+                return
+            view = view[n:]
+        self.counters['bytes'] += len(data)
+
+    def _send(self, msgClass, msgId, payload):
+        self._responses.put(UBXMessage.make(msgClass, msgId, payload))
+
+    def _ack(self, msgClass, msgId, ok):
+        ack = UBX.ACK.ACK if ok else UBX.ACK.NAK
+        self.counters['ACK' if ok else 'NAK'] += 1
+        self._send(UBX.ACK._class, ack._id, bytes([msgClass, msgId]))
+
+    def _onUBX(self, msgClass, msgId, buffer):
+        """Answer a message of the client."""
+        key = (msgClass, msgId)
+        if msgClass != UBX.CFG._class:
+            payload = self.config.get(key)
+            if len(buffer) == 0 and payload is not None:
+                self.counters['polls'] += 1
+                self._send(msgClass, msgId, payload)
+            else:
+                self._ack(msgClass, msgId, False)
+            return
+        Subcls = UBX.CFG._lookup.get(msgId)
+        layout = getattr(Subcls, '_layout', None)
+        if layout is not None and len(buffer) < layout.once.size:
+            # a poll, possibly with arguments such as the port of CFG-PRT
+            self.counters['polls'] += 1
+            payload = self.config.get(key)
+            if payload is None:
+                self._ack(msgClass, msgId, False)
+            else:
+                self._send(msgClass, msgId, payload)
+                self._ack(msgClass, msgId, True)
+            return
+        self.counters['sets'] += 1
+        try:
+            parseUBXPayload(msgClass, msgId, buffer)
+        except Exception:
+            self._ack(msgClass, msgId, False)
+        else:
+            self.config[key] = bytes(buffer)
+            self._ack(msgClass, msgId, True)
+
+    def _onUBXError(self, msgClass, msgId, errMsg):
+        self.counters['errors'] += 1
+
+    def _onNMEA(self, buffer):
+        pass
+
+    def _onNMEAError(self, errMsg):
+        self.counters['errors'] += 1
+
+
+def _defaultConfig():
+    """Return the initial configuration and version of the simulator."""
+    config = {}
+    for Subcls in set(UBX.CFG._lookup.values()):
+        layout = Subcls.__dict__.get('_layout')
+        if layout is not None and layout.repeat is None:
+            config[(UBX.CFG._class, Subcls._id)] = bytes(layout.once.size)
+    # 1 Hz, GPS time
+    config[(UBX.CFG._class, UBX.CFG.RATE._id)] = b'\xe8\x03\x01\x00\x01\x00'
+    config[(UBX.MON._class, UBX.MON.VER._id)] = \
+        b'ROM CORE 3.01 (107888)'.ljust(30, b'\0') + \
+        b'00080000'.ljust(10, b'\0') + \
+        b'PROTVER=18.00'.ljust(30, b'\0')
+    return config
+
+
+def _epochs(logPath):
+    """Split the log into (bytes, seconds since the first epoch) segments.
+
+    A segment starts with each NAV message whose iTOW differs from the
+    one before. Without NAV messages the whole log is one segment.
+    """
+    from UBXLog import UBXLog
+    with UBXLog(logPath) as log:
+        data = bytes(log.data)
+        starts, times = [0], [0.0]
+        first = last = None
+        for offset, iTOW in zip(log.offsets, log.iTOW):
+            if iTOW == log.noITOW or iTOW == last:
+                continue
+            if first is None:
+                first = iTOW
+            elif offset > starts[-1]:
+                starts.append(int(offset))
+                times.append((int(iTOW) - int(first)) % (7 * 86400000)
+                             / 1000.0)
+            last = iTOW
+    starts.append(len(data))
+    return [(data[a:b], t) for a, b, t in zip(starts, starts[1:], times)]
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Simulate a u-blox receiver on a pty or TCP port.'
+        )
+    parser.add_argument(
+        'log', nargs='?',
+        help='log to replay, e.g. UBX.log written by UBXManager'
+        )
+    parser.add_argument(
+        '--speed', type=float, default=1.0,
+        help='replay speed, a multiple of real time'
+        )
+    parser.add_argument(
+        '--baud', type=int, default=None,
+        help='throttle the output to this baud rate'
+        )
+    parser.add_argument(
+        '--jitter', type=float, default=0.0,
+        help='maximum random delay per write in seconds'
+        )
+    parser.add_argument(
+        '--corruption', type=float, default=0.0,
+        help='probability of a bit flip per byte'
+        )
+    parser.add_argument(
+        '--loop', action='store_true',
+        help='replay the log over and over'
+        )
+    parser.add_argument(
+        '--tcp', type=int, default=None, metavar='PORT',
+        help='serve on a TCP port instead of a pty'
+        )
+    args = parser.parse_args()
+
+    sim = UBXSimulator(args.log, speed=args.speed, baudrate=args.baud,
+                       jitter=args.jitter, corruption=args.corruption,
+                       loop=args.loop)
+    if args.tcp is not None:
+        print("Listening on {}:{}".format(*sim.serveTCP('', args.tcp)))
+    else:
+        print("Serving on {}".format(sim.openPty()))
+    sys.stdout.flush()
+    try:
+        while True:
+            sleep(10)
+            print(dict(sim.counters))
+    except KeyboardInterrupt:
+        sim.stop()
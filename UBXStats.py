@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Counters and timing histograms of UBXManager."""
+
+from collections import Counter
+from time import monotonic
+
+
+class Histogram:
+    """Durations in power-of-two buckets of microseconds."""
+
+    def __init__(self):
+        self.buckets = [0] * 32     # bucket b: [2**(b-1), 2**b) us
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        """Add a duration."""
+        b = int(seconds * 1e6).bit_length()
+        self.buckets[b if b < 32 else 31] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def snapshot(self):
+        """Return a dict with count, mean, max and {upper bound in us: n}."""
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'buckets': dict(
+                (1 << b, n) for b, n in enumerate(self.buckets) if n
+            ),
+        }
+
+
+class UBXStats:
+    """Counters filled by UBXManager if instantiated with stats=True."""
+
+    def __init__(self):
+        self.started = monotonic()
+        self.bytesRead = 0
+        self.frames = Counter()     # (msgClass, msgId) -> good frames
+        self.nmea = 0               # good NMEA sentences
+        self.checksumErrors = 0     # UBX frames with a wrong checksum
+        self.nmeaErrors = 0
+        self.parseErrors = 0        # known messages that did not parse
+        self.unknownMessages = Counter()    # (msgClass, msgId) -> frames
+        self.parseTime = Histogram()
+        self.handlerTime = Histogram()
+
+    def snapshot(self):
+        """Return the counters as a dict."""
+        return {
+            'uptime': monotonic() - self.started,
+            'bytesRead': self.bytesRead,
+            'frames': dict(self.frames),
+            'nmea': self.nmea,
+            'checksumErrors': self.checksumErrors,
+            'nmeaErrors': self.nmeaErrors,
+            'parseErrors': self.parseErrors,
+            'unknownMessages': dict(self.unknownMessages),
+            'parseTime': self.parseTime.snapshot(),
+            'handlerTime': self.handlerTime.snapshot(),
+        }
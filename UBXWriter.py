@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Writer thread of UBXManager: queued, coalesced and paced output."""
+
+import sys
+import threading
+from collections import Counter, deque
+from time import monotonic
+
+
+class UBXWriter:
+    """Write frames to a serial port from a dedicated thread.
+
+    write() only queues the frame and returns, so a large CFG-GNSS set at
+    9600 baud does not block the caller. The writer thread joins the queued
+    frames into one ser.write of at most maxWrite bytes; frames are never
+    split, a larger frame is written on its own. With baudrate the output
+    is paced to the port: the next write waits until the UART has sent the
+    previous one (10 bits per byte), so what is waiting stays in the queue
+    instead of the OS buffer, and a priority frame goes out next.
+
+    Frames written with priority=True go into a lane that is always emptied
+    first. When the normal lane holds maxQueueSize frames write() blocks
+    (counted in self.counters['blocked']).
+
+    self.counters has messages, writes, bytes, blocked and errors, stats()
+    adds the queue depth and the bytes per second over the last window
+    seconds.
+    """
+
+    def __init__(self, ser, baudrate=None, maxWrite=512, maxQueueSize=1000,
+                 window=1.0):
+        """Instantiate and start the writer thread."""
+        self.ser = ser
+        self.baudrate = baudrate
+        self.maxWrite = maxWrite
+        self.maxQueueSize = maxQueueSize
+        self.window = window
+        self.counters = Counter()
+        self.highWater = 0              # the most frames queued at once
+        self._lanes = (deque(), deque())    # priority, normal
+        self._queuedBytes = 0
+        self._busy = False              # a write is in progress
+        self._closed = False
+        self._cond = threading.Condition()
+        self._history = deque()         # (time, bytes) of the recent writes
+        self._sentUntil = 0.0           # when the UART is done with the output
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        return len(self._lanes[0]) + len(self._lanes[1])
+
+    def write(self, data, priority=False):
+        """Queue data (a frame) for writing."""
+        data = bytes(data)
+        with self._cond:
+            lane = self._lanes[0 if priority else 1]
+            if not priority and len(lane) >= self.maxQueueSize:
+                self.counters['blocked'] += 1
+                self._cond.wait_for(
+                    lambda: len(lane) < self.maxQueueSize or self._closed
+                )
+            if self._closed:
+                raise Exception("UBXWriter is closed")
+            lane.append(data)
+            self._queuedBytes += len(data)
+            if len(self) > self.highWater:
+                self.highWater = len(self)
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until all queued frames are written.
+
+        Returns False if that did not happen within timeout seconds.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: not len(self) and not self._busy, timeout
+            )
+
+    def close(self, timeout=1.0):
+        """Write what is queued, waiting at most timeout seconds, and stop."""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def stats(self):
+        """Return the counters, the queue depth and the output rate."""
+        with self._cond:
+            self._prune(monotonic())
+            stats = dict(self.counters)
+            stats.update({
+                'queued': len(self),
+                'queuedPriority': len(self._lanes[0]),
+                'queuedBytes': self._queuedBytes,
+                'highWater': self.highWater,
+                'bytesPerSecond':
+                    sum(n for t, n in self._history) / self.window,
+            })
+        return stats
+
+    def _prune(self, now):
+        while self._history and self._history[0][0] < now - self.window:
+            self._history.popleft()
+
+    def _take(self):
+        """Return the frames of the next write, with the lock held."""
+        frames, n = [], 0
+        for lane in self._lanes:
+            while lane and (not frames or n + len(lane[0]) <= self.maxWrite):
+                frames.append(lane.popleft())
+                n += len(frames[-1])
+            if lane:    # keep the order: no normal frame before a priority one
+                break
+        return frames
+
+    def _run(self):
+        """Writer thread: write the queued frames until closed."""
+        while True:
+            if self.baudrate:
+                with self._cond:    # until the UART is idle, or closed
+                    self._cond.wait_for(
+                        lambda: self._closed, self._sentUntil - monotonic()
+                    )
+            with self._cond:
+                self._cond.wait_for(lambda: len(self) or self._closed)
+                if not len(self):
+                    return
+                frames = self._take()
+                self._busy = True
+                self._cond.notify_all()     # there is room in the lane now
+            data = frames[0] if len(frames) == 1 else b''.join(frames)
+            try:
+                self.ser.write(data)
+            except Exception as e:
+                self.counters['errors'] += 1
+                sys.stderr.write("UBXWriter: {}\n".format(e))
+            now = monotonic()
+            if self.baudrate:
+                self._sentUntil = max(self._sentUntil, now) + \
+                    10.0 * len(data) / self.baudrate
+            with self._cond:
+                self.counters['messages'] += len(frames)
+                self.counters['writes'] += 1
+                self.counters['bytes'] += len(data)
+                self._history.append((now, len(data)))
+                self._prune(now)
+                self._queuedBytes -= len(data)
+                self._busy = False
+                self._cond.notify_all()
@@ -4,104 +4,29 @@
 import sys
 import os
 import serial
-from time import sleep
+from time import sleep, monotonic
 from threading import Lock
-from enum import Enum
+from concurrent.futures import wait
 import argparse
 import datetime
 import UBX
 from UBXManager import UBXManager
-from FSM import *
-
-
-@FSM_Get(UBX.MON.VER)
-class FSM_VER_Get:
-    pass
-
-
-@FSM_Get(UBX.CFG.GNSS)
-class FSM_GNSS_Get:
-    pass
-
-
-@FSM_Get(UBX.CFG.PMS)
-class FSM_PMS_Get:
-    pass
-
-
-@FSM_Get(UBX.CFG.PM2)
-class FSM_PM2_Get:
-    pass
-
-
-@FSM_Get(UBX.CFG.RATE)
-class FSM_RATE_Get:
-    pass
-
-
-class FSM_RXM_Set:
-    """FSM handling MON.VER.Get"""
-    _class = UBX.CFG.RXM._class
-    _id = UBX.CFG.RXM._id
-    class STATE(Enum):
-        START = 0
-        WAIT_GET = 1
-        WAIT_GET_ACK = 2
-        WAIT_SET_ACK = 3
-        DONE = 4
-    def __init__(self, lpMode):
-        self.state = FSM_RXM_Set.STATE.START
-        self.ver = None
-        self._gottenObj = None
-        self.lpMode = lpMode
-    def done(self):
-        return self.state == FSM_RXM_Set.STATE.DONE
-    def onUBX(self, obj, manager):
-        print(obj)
-        if self.state == FSM_RXM_Set.STATE.START:
-            if isObj(obj, UBX.CFG.RXM):
-                self._gottenObj = obj
-                self.state = FSM_RXM_Set.STATE.WAIT_GET_ACK
-            else:
-                print("Didnt' get a UBX.CFG.RXM")
-                self.state = FSM_RXM_Set.STATE.DONE
-        elif self.state == FSM_RXM_Set.STATE.WAIT_GET_ACK:
-            if isACK(obj):
-                self._gottenObj.lpMode = self.lpMode
-                manager.send(self._gottenObj.serialize())
-                self.state = FSM_RXM_Set.STATE.WAIT_SET_ACK
-            else:
-                print("Ooops that went wrong, I was expecting an ACK")
-                self.state = FSM_RXM_Set.STATE.DONE
-        elif self.state == FSM_RXM_Set.STATE.WAIT_SET_ACK:
-            if isACK(obj):
-                self.state = FSM_RXM_Set.STATE.DONE
-            else:
-                print("Ooops that went wrong, I was expecting an ACK")
-                self.state = FSM_RXM_Set.STATE.DONE
-        else:
-            raise Exception("The FSM went boink.")
+from UBXWriter import UBXWriter
 
 
 class Manager(UBXManager):
-    def __init__(self, ser, debug=False):
-        UBXManager.__init__(self, ser, debug)
+    def __init__(self, ser, debug=False, writer=None):
+        UBXManager.__init__(self, ser, debug, writer=writer)
         self._lock = Lock()
         self._dumpNMEA = True    # with _lock
-        self._fsm = None         # with _lock
+        self._inFlight = set()   # futures of the requests made, with _lock
     def setDumpNMEA(self, val):
         with self._lock:
             self._dumpNMEA = val
         if self.debug:
             print("dumpNMEA={}".format(val))
     def onUBX(self, obj):
-        with self._lock:
-            if self._fsm is not None:
-                self._fsm.onUBX(obj, self)
-                if self._fsm.done():
-                    self._fsm = None
-            else:
-                print(obj)
+        print(obj)
     def onUBXError(self, msgClass, msgId, errMsg):
         print(msgClass, msgId, errMsg)
     def onNMEA(self, buffer):
@@ -109,47 +34,61 @@ class Manager(UBXManager):
             dump = self._dumpNMEA
         if dump:
             print("{} {}".format(datetime.datetime.now().isoformat(), buffer))
+    def _track(self, future, onDone):
+        """Keep future in flight until onDone(future) has run."""
+        def done(future):
+            try:
+                onDone(future)
+            finally:
+                with self._lock:
+                    self._inFlight.discard(future)
+        with self._lock:
+            self._inFlight.add(future)
+        future.add_done_callback(done)
+        return future
     def done(self):
         with self._lock:
-            return self._fsm is None
+            return not self._inFlight
     def waitUntilDone(self, timeout=None):
-        sleepTime = 0
-        while not self.done():
-            sleep(0.5)
-            sleepTime += 0.5
-            if timeout is not None and sleepTime > timeout:
+        """Wait for all requests made, return False on timeout."""
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            with self._lock:
+                inFlight = list(self._inFlight)
+            if not inFlight:
+                return True
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
                 return False
-        return True
+            wait(inFlight, remaining)
+    def _get(self, msgCls):
+        self._track(self.submit(msgCls.Get()), _printResult)
     def VER_GET(self):
-        msg = UBX.MON.VER.Get().serialize()
-        with self._lock:
-            self._fsm = FSM_VER_Get()
-        self.send(msg)
+        self._get(UBX.MON.VER)
     def GNSS_GET(self):
-        msg = UBX.CFG.GNSS.Get().serialize()
-        with self._lock:
-            self._fsm = FSM_GNSS_Get()
-        self.send(msg)
+        self._get(UBX.CFG.GNSS)
     def PMS_GET(self):
-        msg = UBX.CFG.PMS.Get().serialize()
-        with self._lock:
-            self._fsm = FSM_PMS_Get()
-        self.send(msg)
+        self._get(UBX.CFG.PMS)
     def PM2_GET(self):
-        msg = UBX.CFG.PM2.Get().serialize()
-        with self._lock:
-            self._fsm = FSM_PM2_Get()
-        self.send(msg)
+        self._get(UBX.CFG.PM2)
     def RATE_GET(self):
-        msg = UBX.CFG.RATE.Get().serialize()
-        with self._lock:
-            self._fsm = FSM_RATE_Get()
-        self.send(msg)
+        self._get(UBX.CFG.RATE)
     def RXM_SET(self, lpMode):
-        msg = UBX.CFG.RXM.Get().serialize()
-        with self._lock:
-            self._fsm = FSM_RXM_Set(lpMode)
-        self.send(msg)
+        """Poll CFG-RXM, wait for its ACK, then set lpMode and wait again."""
+        result, = self.configure([(UBX.CFG.RXM, {'lpMode': lpMode})])
+        if result.obj is not None:
+            print(result.obj)
+        if not result.ok:
+            print("Ooops that went wrong: {}".format(result.error))
+
+
+def _printResult(future):
+    if future.cancelled():
+        return
+    if future.exception() is not None:
+        print("Ooops that went wrong: {}".format(future.exception()))
+    else:
+        print(future.result())
 
 
 if __name__ == '__main__':
@@ -194,7 +133,8 @@ if __name__ == '__main__':
     ser = serial.Serial('/dev/ttyAMA0', 9600, timeout=None)
     debug = (os.environ.get("DEBUG") is not None) or args.debug
 
-    manager = Manager(ser, debug=debug)
+    manager = Manager(ser, debug=debug,
+                      writer=UBXWriter(ser, baudrate=ser.baudrate))
     manager.setDumpNMEA(False)  # temporarily turn off NMEA print
     if debug:
         sys.stderr.write("Starting UBXManager...\n")
@@ -202,11 +142,11 @@ if __name__ == '__main__':
 
     sleep(1)
 
-    # do all getters
+    # do all getters, they are pipelined
     for argName in filter(lambda s: s.endswith("_GET"), args.__dict__.keys()):
         if args.__dict__[argName]:
             getattr(manager, argName)()
-            manager.waitUntilDone()
+    manager.waitUntilDone()
 
     if args.RXM is not None:
         manager.RXM_SET(args.RXM)
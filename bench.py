@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""Benchmarks for parsing, framing and serialization.
+
+Run offline against synthetic data, print messages per second (and MB/s
+for streams) and optionally store the results as JSON or compare them to
+a stored baseline:
+
+    ./bench.py --json base.json
+    ./bench.py --compare base.json --threshold 0.2   # exit 1 on regression
+
+With --memory the memory kept per decoded message is measured instead.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import timeit
+import tracemalloc
+from functools import reduce
+from operator import xor
+import UBX
+from UBXMessage import UBXMessage, parseUBXPayload, parseUBXMessage
+from UBXMessage import classFromMessageClass
+from UBXMessage import numpy
+
+
+# (msgClass, msgId, payload) of a few typical messages
+PAYLOADS = [
+    (UBX.ACK._class, UBX.ACK.ACK._id, b'\x06\x11'),
+    (UBX.CFG._class, UBX.CFG.RXM._id, b'\x48\x01'),
+    (UBX.NAV._class, UBX.NAV.TIMEGPS._id, bytes(16)),
+    (UBX.NAV._class, UBX.NAV.SAT._id, bytes(8 + 12 * 20)),
+]
+
+
+# Default message mix of syntheticStream: output every n-th epoch
+RATES = {'NMEA': 1, 'NAV-SAT': 1, 'RXM-RAWX': 1, 'MON-HW': 10}
+
+
+def _nmea(body):
+    """Return the NMEA sentence with body, checksum and CR LF."""
+    return "${}*{:02X}\r\n".format(body, reduce(xor, body.encode(), 0)) \
+        .encode()
+
+
+def syntheticStream(epochs=100, rates=RATES, numSvs=20, numMeas=30,
+                    corruption=0.01, seed=0):
+    """Return (stream, frames): a receiver output and its valid frames.
+
+    In every n-th epoch (see RATES) the stream contains NMEA sentences
+    (GGA, RMC, GSA, 3 GSV), NAV-SAT with numSvs satellites, RXM-RAWX with
+    numMeas measurements and MON-HW. The payloads are random. A fraction
+    corruption of the frames gets a flipped byte and is preceded by a run
+    of garbage. frames lists the frames that were not corrupted.
+    """
+    rnd = random.Random(seed)
+    stream, frames = bytearray(), []
+    for epoch in range(epochs):
+        out = []
+        if rates.get('NMEA') and epoch % rates['NMEA'] == 0:
+            out += [
+                _nmea("GPGGA,{:06d}.00,4717.11399,N,00833.91590,E,1,08,"
+                      "1.01,499.6,M,48.0,M,,".format(epoch % 240000)),
+                _nmea("GPRMC,{:06d}.00,A,4717.11437,N,00833.91522,E,0.004,"
+                      "77.52,091202,,,A".format(epoch % 240000)),
+                _nmea("GPGSA,A,3,10,07,05,02,29,04,08,13,,,,,1.72,1.03,1.38"),
+            ] + [
+                _nmea("GPGSV,3,{},12,{:02d},40,083,46,{:02d},17,308,41,"
+                      "12,07,344,39,14,22,228,45".format(i, i, i + 10))
+                for i in range(1, 4)
+            ]
+        for name, msgCls, length in [
+            ('NAV-SAT', UBX.NAV.SAT, 8 + 12 * numSvs),
+            ('RXM-RAWX', UBX.RXM.RAWX, 16 + 32 * numMeas),
+            ('MON-HW', UBX.MON.HW, 60),
+        ]:
+            if rates.get(name) and epoch % rates[name] == 0:
+                payload = bytearray(rnd.getrandbits(8) for i in range(length))
+                if msgCls is UBX.NAV.SAT:
+                    payload[5] = numSvs
+                elif msgCls is UBX.RXM.RAWX:
+                    payload[11] = numMeas
+                out.append(UBXMessage.make(
+                    msgCls._class, msgCls._id, bytes(payload)
+                ))
+        for frame in out:
+            if rnd.random() < corruption:
+                frame = bytearray(frame)
+                frame[rnd.randrange(1, len(frame))] ^= 0xff
+                stream += bytes(rnd.getrandbits(8)
+                                for i in range(rnd.randrange(1, 64)))
+            else:
+                frames.append(bytes(frame))
+            stream += frame
+    return bytes(stream), frames
+
+
+def _legacyParseUBXPayload(msgClass, msgId, payload):
+    """Dispatch as it was done before the message registry."""
+    Cls = classFromMessageClass().get(msgClass)
+    return Cls._lookup.get(msgId)(payload)
+
+
+def rate(f, number=None):
+    """Return the number of calls of f per second."""
+    timer = timeit.Timer(f)
+    if number is None:
+        number, _ = timer.autorange()
+    return number / min(timer.repeat(repeat=3, number=number))
+
+
+def benchParse(parse):
+    """Return messages per second parsed with parse over PAYLOADS."""
+    def f():
+        for msgClass, msgId, payload in PAYLOADS:
+            parse(msgClass, msgId, payload)
+    return rate(f) * len(PAYLOADS)
+
+
+def benchRAWX():
+    """Return RXM-RAWX messages with 60 measurements parsed per second."""
+    payload = bytes(16 + 32 * 60)
+    return rate(lambda: parseUBXPayload(
+        UBX.RXM._class, UBX.RXM.RAWX._id, payload
+    ))
+
+
+def benchRAWXLazy():
+    """Return lazily parsed RXM-RAWX messages per second, reading one field."""
+    payload = bytes(16 + 32 * 60)
+    return rate(lambda: parseUBXPayload(
+        UBX.RXM._class, UBX.RXM.RAWX._id, payload, lazy=True
+    ).numMeas)
+
+
+def benchSerialize():
+    """Return messages per second serialized over PAYLOADS."""
+    objs = [parseUBXPayload(*p) for p in PAYLOADS]
+    def f():
+        for obj in objs:
+            obj.serialize()
+    return rate(f) * len(objs)
+
+
+def _legacyChecksum(msg):
+    """Compute the checksum byte by byte as it was done before."""
+    a = b = 0
+    for i in msg:
+        i = ord(bytes([i]))
+        a += i
+        a &= 0xff
+        b += a
+        b &= 0xff
+    return a * 256 + b
+
+
+def benchChecksum(checksum):
+    """Return 1 kB checksums per second computed with checksum."""
+    msg = bytes(range(256)) * 4
+    return rate(lambda: checksum(msg))
+
+
+def benchChecksumMany():
+    """Return 1 kB checksums per second verified in batches of 1000."""
+    if numpy is None:
+        return float('nan')
+    data = numpy.frombuffer(bytes(range(256)) * 4000, dtype=numpy.uint8)
+    starts = numpy.arange(0, len(data), 1024)
+    return rate(lambda: UBXMessage.Checksum.many(
+        data, starts, starts + 1024
+    )) * len(starts)
+
+
+class _CountingSink:
+    """Framer sink counting the valid frames."""
+    def __init__(self):
+        self.n = 0
+    def _onUBX(self, msgClass, msgId, buffer):
+        self.n += 1
+    def _onNMEA(self, buffer):
+        self.n += 1
+    def _onUBXError(self, msgClass, msgId, errMsg):
+        pass
+    def _onNMEAError(self, errMsg):
+        pass
+
+
+def benchFramer(readFrom):
+    """Return RXM-RAWX frames (60 meas) per second framed in 4 kB reads."""
+    from UBXFramer import UBXFramer
+    frame = UBX.RXM.RAWX(bytes(16 + 32 * 60)).serialize()
+    data = frame * 100
+    def f():
+        stream = io.BytesIO(data)
+        framer = UBXFramer(_CountingSink())
+        if readFrom:
+            while framer.readFrom(stream, 4096):
+                pass
+        else:
+            for i in range(0, len(data), 4096):
+                framer.feed(data[i:i+4096])
+    return rate(f) * 100
+
+
+def _streamRate(f, stream, count):
+    """Return the results for f processing count messages of stream."""
+    r = rate(f)
+    return {'msg/s': r * count, 'MB/s': r * len(stream) / 1e6}
+
+
+def benchStreamFramer(stream):
+    """Frame the synthetic stream in 4 kB chunks."""
+    from UBXFramer import UBXFramer
+    sink = _CountingSink()
+    UBXFramer(sink).feed(stream)
+    def f():
+        framer = UBXFramer(_CountingSink())
+        for i in range(0, len(stream), 4096):
+            framer.feed(stream[i:i+4096])
+    return _streamRate(f, stream, sink.n)
+
+
+class _Replay(io.BytesIO):
+    """Stream that shuts the manager down at its end."""
+
+    def readinto1(self, b):
+        n = io.BytesIO.readinto1(self, b)
+        if not n:
+            self.manager.shutdown()
+        return n
+
+
+def benchStreamManager(stream, **kwargs):
+    """Read, frame and parse the synthetic stream with UBXManager."""
+    from UBXManager import UBXManager
+    counts = []
+    def f():
+        ser = _Replay(stream)
+        manager = ser.manager = UBXManager(ser, **kwargs)
+        n = [0]
+        def count(obj):
+            n[0] += 1
+        manager.onUBX = manager.onNMEA = count
+        manager.onUBXError = manager.onNMEAError = lambda *args: None
+        manager.run()
+        counts.append(n[0])
+    r = rate(f)
+    return {'msg/s': r * counts[-1], 'MB/s': r * len(stream) / 1e6}
+
+
+def benchStreamParse(frames):
+    """Parse the UBX frames of the synthetic stream with parseUBXMessage."""
+    frames = [f for f in frames if f[:1] == UBXMessage.sync_char_1]
+    def f():
+        for frame in frames:
+            parseUBXMessage(frame)
+    return _streamRate(f, b''.join(frames), len(frames))
+
+
+def benchStreamMake(frames):
+    """Rebuild the UBX frames of the synthetic stream with UBXMessage.make."""
+    items = [(f[2], f[3], f[6:-2]) for f in frames
+             if f[:1] == UBXMessage.sync_char_1]
+    def f():
+        for msgClass, msgId, payload in items:
+            UBXMessage.make(msgClass, msgId, payload)
+    return _streamRate(f, b''.join(frames), len(items))
+
+
+def benchStreamMakeMany(frames):
+    """Rebuild the UBX frames of the synthetic stream with one makeMany."""
+    items = [(f[2], f[3], f[6:-2]) for f in frames
+             if f[:1] == UBXMessage.sync_char_1]
+    return _streamRate(lambda: UBXMessage.makeMany(items),
+                       b''.join(frames), len(items))
+
+
+def benchGet():
+    """Return MON-HW poll frames built per second."""
+    return rate(lambda: UBX.MON.HW.Get().serialize())
+
+
+def benchStreamSerialize(frames):
+    """Serialize the parsed UBX messages of the synthetic stream."""
+    objs = [parseUBXMessage(f) for f in frames
+            if f[:1] == UBXMessage.sync_char_1]
+    def f():
+        for obj in objs:
+            obj.serialize()
+    return _streamRate(f, b''.join(frames), len(objs))
+
+
+def benchStreamNMEA(frames):
+    """Parse the NMEA sentences of the synthetic stream."""
+    from NMEAMessage import parseNMEASentence
+    sentences = [f[1:-5].decode() for f in frames if f[:1] == b'$']
+    def f():
+        for sentence in sentences:
+            parseNMEASentence(sentence)
+    return _streamRate(f, b''.join(frames), len(sentences))
+
+
+def benchStreamRecords(stream):
+    """Read a recording (one record per frame) of the synthetic stream."""
+    import UBXRecording
+    with tempfile.TemporaryDirectory() as tmp:
+        log, rec = os.path.join(tmp, 'UBX.log'), os.path.join(tmp, 'UBX.rec')
+        with open(log, 'wb') as f:
+            f.write(stream)
+        count = UBXRecording.fromRaw(log, rec, baudrate=115200)
+        return _streamRate(lambda: list(UBXRecording.readRecords(rec)),
+                           stream, count)
+
+
+_stream = []
+
+
+def _synthetic():
+    """Return the synthetic (stream, frames), generated once."""
+    if not _stream:
+        _stream.append(syntheticStream(epochs=100, corruption=0.01))
+    return _stream[0]
+
+
+BENCHMARKS = [
+    ("parseUBXPayload (inspect dispatch)",
+     lambda: benchParse(_legacyParseUBXPayload)),
+    ("parseUBXPayload (registry dispatch)",
+     lambda: benchParse(parseUBXPayload)),
+    ("parseUBXPayload RXM-RAWX (60 meas)", benchRAWX),
+    ("parseUBXPayload RXM-RAWX (lazy)", benchRAWXLazy),
+    ("serialize", benchSerialize),
+    ("MON-HW Get().serialize()", benchGet),
+    ("checksum 1 kB (byte by byte)", lambda: benchChecksum(_legacyChecksum)),
+    ("checksum 1 kB (Checksum)",
+     lambda: benchChecksum(lambda msg: UBXMessage.Checksum(msg).get())),
+    ("checksum 1 kB (Checksum.many)", benchChecksumMany),
+    ("UBXFramer RXM-RAWX (feed)", lambda: benchFramer(False)),
+    ("UBXFramer RXM-RAWX (readFrom)", lambda: benchFramer(True)),
+    ("stream: UBXFramer", lambda: benchStreamFramer(_synthetic()[0])),
+    ("stream: UBXManager", lambda: benchStreamManager(_synthetic()[0])),
+    ("stream: UBXManager (lazy)",
+     lambda: benchStreamManager(_synthetic()[0], lazy=True)),
+    ("stream: parseUBXMessage", lambda: benchStreamParse(_synthetic()[1])),
+    ("stream: UBXMessage.make", lambda: benchStreamMake(_synthetic()[1])),
+    ("stream: UBXMessage.makeMany",
+     lambda: benchStreamMakeMany(_synthetic()[1])),
+    ("stream: serialize", lambda: benchStreamSerialize(_synthetic()[1])),
+    ("stream: parseNMEASentence", lambda: benchStreamNMEA(_synthetic()[1])),
+    ("stream: UBXRecording.readRecords",
+     lambda: benchStreamRecords(_synthetic()[0])),
+]
+
+
+class _DictMessage:
+    """A decoded message as it was before __slots__."""
+
+
+def _legacyDecode(msgCls, payload):
+    """Decode payload into the __dict__ of an object as it was done before."""
+    obj = _DictMessage()
+    names, values = msgCls._layout.decode(payload)
+    obj.__dict__.update(zip(names, values))
+    obj._len = len(payload)
+    return obj
+
+
+def memoryPerMessage(decode, n=1000):
+    """Return the bytes traced by tracemalloc per object of decode() kept."""
+    decode()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objs = [decode() for i in range(n)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del objs
+    return (after - before) / n
+
+
+# (name, message, payload length) of the memory benchmarks
+MEMORY = [
+    ("NAV-TIMEGPS", UBX.NAV.TIMEGPS, 16),
+    ("NAV-SAT (20 SVs)", UBX.NAV.SAT, 8 + 12 * 20),
+    ("RXM-RAWX (30 meas)", UBX.RXM.RAWX, 16 + 32 * 30),
+]
+
+
+def runMemoryBenchmarks(pattern=None):
+    """Measure the memory per kept message with and without __slots__.
+
+    The payloads are random, so most values are distinct int objects as
+    in real data. Returns {name: {'dict B/msg', 'slots B/msg'}}.
+    """
+    rnd = random.Random(0)
+    results = {}
+    for name, msgCls, length in MEMORY:
+        if pattern is not None and pattern not in name:
+            continue
+        payload = bytes(rnd.getrandbits(8) for i in range(length))
+        result = {
+            'dict B/msg': memoryPerMessage(
+                lambda: _legacyDecode(msgCls, payload)),
+            'slots B/msg': memoryPerMessage(lambda: msgCls(payload)),
+        }
+        results[name] = result
+        print("{:40s} {:8.0f} B/msg (dict) {:8.0f} B/msg (slots) {:6.2f}x"
+              .format(name, result['dict B/msg'], result['slots B/msg'],
+                      result['dict B/msg'] / result['slots B/msg']))
+        sys.stdout.flush()
+    return results
+
+
+def runBenchmarks(pattern=None):
+    """Run the benchmarks whose name contains pattern, print and return them.
+
+    The results map the benchmark name to {'msg/s': ..., 'us/msg': ...}
+    and for streams 'MB/s'.
+    """
+    results = {}
+    for name, bench in BENCHMARKS:
+        if pattern is not None and pattern not in name:
+            continue
+        result = bench()
+        if not isinstance(result, dict):
+            result = {'msg/s': result}
+        result['us/msg'] = 1e6 / result['msg/s']
+        results[name] = result
+        line = "{:40s} {:12.0f} msg/s".format(name, result['msg/s'])
+        if 'MB/s' in result:
+            line += " {:8.2f} MB/s".format(result['MB/s'])
+        print(line)
+        sys.stdout.flush()
+    return results
+
+
+def compareResults(results, baseline, threshold):
+    """Return the names of the benchmarks slower than baseline.
+
+    A benchmark regressed if its msg/s dropped by more than the fraction
+    threshold.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None or base['msg/s'] != base['msg/s']:     # NaN
+            continue
+        ratio = result['msg/s'] / base['msg/s']
+        print("{:40s} {:8.2f}x{}".format(
+            name, ratio, "  REGRESSION" if ratio < 1 - threshold else ""
+        ))
+        if ratio < 1 - threshold:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        'pattern', nargs='?',
+        help='only run the benchmarks whose name contains pattern'
+        )
+    parser.add_argument(
+        '--json', dest='json', metavar='FILE',
+        help='store the results as JSON in FILE'
+        )
+    parser.add_argument(
+        '--compare', dest='compare', metavar='FILE',
+        help='compare the results to the JSON results in FILE'
+        )
+    parser.add_argument(
+        '--threshold', dest='threshold', type=float, default=0.1,
+        help='allowed relative slowdown for --compare (default 0.1)'
+        )
+    parser.add_argument(
+        '--memory', action='store_true',
+        help='measure the memory per decoded message instead'
+        )
+    args = parser.parse_args()
+
+    if args.memory:
+        runMemoryBenchmarks(args.pattern)
+        sys.exit(0)
+    results = runBenchmarks(args.pattern)
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'numpy': numpy is not None and numpy.__version__,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+        if compareResults(results, baseline, args.threshold):
+            sys.exit(1)
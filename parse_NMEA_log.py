@@ -1,32 +1,164 @@
 #!/usr/bin/env python3
 """Scan the output produced by UBX.py --NMEA and transform it back into
 proper NMEA with $ and * and checksum. This output can then be used with other
-tools."""
+tools.
 
+The input is read in chunks of whole lines (mmap'd for files, '-' is
+stdin), so memory use does not depend on its size. With -j N the chunks
+are converted by N worker processes; the output stays in order."""
+
+import argparse
+import collections
+import mmap
+import multiprocessing
 import sys
+from UBXMessage import numpy
+
+
+_HEX = [b'%02x' % i for i in range(256)]
+
+
+def xorChecksum(data):
+    """Return the XOR of all bytes of data, folded as one big integer."""
+    n = len(data)
+    x = int.from_bytes(data, 'little')
+    while n > 1:
+        half = (n + 1) // 2
+        x = (x ^ (x >> (8 * half))) & ((1 << (8 * half)) - 1)
+        n = half
+    return x
 
 
 def NMEAChkSum(line):
     """Return NMEA checksum of line as a string."""
-    chksum = 0
-    for c in line:
-        chksum ^= ord(c)
-    return '{:02x}'.format(chksum)
+    return '{:02x}'.format(xorChecksum(line.encode()))
+
+
+def convertChunk(data):
+    """Convert the lines "timestamp NMEA" of data to "$NMEA*cs".
+
+    data holds complete lines. Returns (output, number of bad lines); a
+    line is bad unless it has exactly one space after stripping it.
+    """
+    lines = data.splitlines()
+    bodies = [parts[1] for parts in (line.strip().split(b' ')
+                                     for line in lines)
+              if len(parts) == 2]
+    out = b''.join([
+        b'$%b*%b\n' % (body, _HEX[c])
+        for body, c in zip(bodies, checksums(bodies))
+    ])
+    return out, len(lines) - len(bodies)
+
+
+def checksums(bodies):
+    """Return the XOR checksums of the byte strings bodies.
+
+    With NumPy they are computed in one pass over the joined bodies.
+    """
+    if numpy is None or not bodies:
+        return [xorChecksum(body) for body in bodies]
+    joined = numpy.frombuffer(b''.join(bodies), dtype=numpy.uint8)
+    xors = numpy.zeros(len(joined) + 1, dtype=numpy.uint8)
+    numpy.bitwise_xor.accumulate(joined, out=xors[1:])
+    ends = numpy.zeros(len(bodies) + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.fromiter(map(len, bodies), numpy.int64, len(bodies)),
+                 out=ends[1:])
+    return (xors[ends[1:]] ^ xors[ends[:-1]]).tolist()
 
-if len(sys.argv) < 2:
-    sys.stderr.write("Usage:\n  parse_NMEA_log.py FILENAME\n\n" + __doc__)
-    sys.exit(1)
 
-with open(sys.argv[1], "r") as file:
+def fileChunks(path, chunkSize):
+    """Yield (start, end) of ranges of whole lines of the file."""
+    with open(path, 'rb') as f:
+        if not f.seek(0, 2):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            start = 0
+            while start < len(m):
+                end = m.find(b'\n', start + chunkSize) + 1 or len(m)
+                yield start, end
+                start = end
 
+
+def streamChunks(stream, chunkSize):
+    """Yield chunks of whole lines of the binary stream."""
+    while True:
+        data = stream.read(chunkSize)
+        if not data:
+            return
+        yield data + stream.readline()
+
+
+def _convertRange(args):
+    path, start, end = args
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            return convertChunk(m[start:end])
+
+
+def convert(src, dst, processes=1, chunkSize=1 << 20):
+    """Convert src (a path or '-' for stdin) to the binary stream dst.
+
+    Returns the number of bad lines.
+    """
+    if src == '-':
+        tasks, work = streamChunks(sys.stdin.buffer, chunkSize), convertChunk
+    else:
+        tasks = ((src, a, b) for a, b in fileChunks(src, chunkSize))
+        work = _convertRange
     errCount = 0
-    for line in file.readlines():
-        try:
-            [dt, NMEA] = line.strip().split(" ")
-        except:
-            errCount += 1
-        else:
-            print("${}*{}".format(NMEA, NMEAChkSum(NMEA)))
+    if processes <= 1:
+        for task in tasks:
+            out, bad = work(task)
+            dst.write(out)
+            errCount += bad
+        return errCount
+    with multiprocessing.Pool(processes) as pool:
+        inFlight = collections.deque()     # bounded to keep memory constant
+        for task in tasks:
+            inFlight.append(pool.apply_async(work, (task,)))
+            if len(inFlight) >= 2 * processes:
+                out, bad = inFlight.popleft().get()
+                dst.write(out)
+                errCount += bad
+        while inFlight:
+            out, bad = inFlight.popleft().get()
+            dst.write(out)
+            errCount += bad
+    return errCount
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+        )
+    parser.add_argument(
+        'filename', nargs='?', default='-',
+        help='log of UBX.py --NMEA, - for stdin (default)'
+        )
+    parser.add_argument(
+        '-o', '--output', default='-',
+        help='output file, - for stdout (default)'
+        )
+    parser.add_argument(
+        '-j', '--processes', type=int, default=1,
+        help='number of worker processes'
+        )
+    parser.add_argument(
+        '--chunk-size', type=int, default=1 << 20,
+        help='bytes per chunk'
+        )
+    args = parser.parse_args()
+
+    if args.output == '-':
+        errCount = convert(args.filename, sys.stdout.buffer,
+                           args.processes, args.chunk_size)
+    else:
+        with open(args.output, 'wb') as dst:
+            errCount = convert(args.filename, dst,
+                               args.processes, args.chunk_size)
 
     if errCount:
         sys.stderr.write("Found {} bad lines.\n".format(errCount))
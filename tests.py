@@ -1,9 +1,53 @@
 #!/usr/bin/env python3
 """Unit tests."""
 
+import asyncio
+import concurrent.futures
+import functools
+import gzip
+import io
+import lzma
+import os
+import tempfile
+import threading
 import unittest
+from functools import reduce
+from operator import xor
+from time import monotonic, sleep
 import UBX
 from UBXMessage import parseUBXPayload, parseUBXMessage
+from UBXMessage import registerMessage, lookupMessage
+from UBXMessage import UBXMessage, numpy
+from UBXFramer import UBXFramer
+from UBXLog import UBXLog
+import NMEAMessage
+from UBXHub import UBXHub
+from UBXRing import UBXRing
+from UBXWriter import UBXWriter
+from UBXCapture import UBXCapture
+import UBXRecording
+from UBXSimulator import UBXSimulator
+from UBXManager import UBXManager
+from AsyncUBXManager import AsyncUBXManager
+
+
+# NAV-SAT with two satellites (svId 5 and 11) and its frame.
+NAV_SAT_PAYLOAD = b'\x10\x27\x00\x00\x01\x02\x00\x00' + \
+    b'\x00\x05\x2a\x1e\x10\x01\xfe\xff\x01\x00\x00\x00' + \
+    b'\x06\x0b\x20\xf6\x20\x00\x05\x00\x00\x10\x00\x00'
+NAV_SAT_FRAME = b'\xb5\x62\x01\x35\x20\x00' + NAV_SAT_PAYLOAD + b'HV'
+
+
+def navSatPayload(N):
+    """Return a NAV-SAT payload of N satellites, the k-th has elev -k."""
+    return b'\x10\x27\x00\x00\x01' + bytes([N, 0, 0]) + b''.join(
+        bytes([0, k, 0x20, -k & 0xff]) + bytes(8) for k in range(1, N + 1)
+    )
+
+
+def parseNavSat(payload=NAV_SAT_PAYLOAD, **kwargs):
+    """Parse payload as NAV-SAT, kwargs as for parseUBXPayload."""
+    return parseUBXPayload(UBX.NAV._class, UBX.NAV.SAT._id, payload, **kwargs)
 
 
 class TestStringMethods(unittest.TestCase):
@@ -115,6 +159,932 @@ class TestStringMethods(unittest.TestCase):
         self.assertEqual(msg._id, 0x04)
         self.assertEqual(msg.serialize(), b'\xb5\x62\x06\x04\x04\x00\xff\xff\x01\x00\r_')
 
+    def testNAV_SAT(self):
+        sat = parseNavSat()
+        self.assertEqual(sat.iTOW, 10000)
+        self.assertEqual(sat.numSvs, 2)
+        self.assertEqual(sat.svId_1, 5)
+        self.assertEqual(sat.prRes_1, -2)
+        self.assertEqual(sat.gnssId_2, 6)
+        self.assertEqual(sat.elev_2, -10)
+        self.assertEqual(sat.flags_2, 0x1000)
+        self.assertEqual(sat.serialize(), NAV_SAT_FRAME)
+        self.assertEqual(parseUBXMessage(sat.serialize()).azim_2, 32)
+
+    def testColumnar(self):
+        sat = parseNavSat(columnar=True)
+        self.assertEqual(sat.numSvs, 2)
+        self.assertEqual(len(sat.svs), 2)
+        self.assertEqual(list(sat.svs['svId']), [5, 11])
+        self.assertEqual(list(sat.svs['elev']), [30, -10])
+        self.assertEqual(sat.prRes_1, -2)
+        with self.assertRaises(AttributeError):
+            sat.prRes_3
+        eager = parseNavSat()
+        self.assertEqual(str(sat), str(eager))
+        self.assertEqual(sat.serialize(), eager.serialize())
+
+    def testColumnarAssign(self):
+        # nothing decoded 50 satellites yet, the columnar parse alone has to
+        # install the accessor of the 50th
+        payload = navSatPayload(50)
+        self.assertNotIn('elev_50', vars(UBX.NAV.SAT))
+        sat = parseNavSat(payload, columnar=True)
+        sat.elev_50 = -5     # the columns follow
+        self.assertEqual(list(sat.svs['elev'][-2:]), [-49, -5])
+        self.assertEqual(sat.elev_50, -5)
+        self.assertEqual(parseUBXMessage(sat.serialize()).elev_50, -5)
+
+    def testLazy(self):
+        eager = parseNavSat()
+        sat = parseNavSat(lazy=True)
+        with self.assertRaises(AttributeError):     # not decoded yet
+            object.__getattribute__(sat, 'numSvs')
+        self.assertEqual(sat.numSvs, 2)
+        self.assertEqual(object.__getattribute__(sat, 'numSvs'), 2)
+        self.assertEqual(sat.elev_2, -10)
+        self.assertEqual(str(sat), str(eager))
+        self.assertEqual(sat.serialize(), eager.serialize())
+        self.assertTrue(set(dir(eager)) <= set(dir(sat)))
+        with self.assertRaises(AttributeError):
+            sat.elev_3
+        sat.iTOW = 20000
+        self.assertEqual(parseUBXMessage(sat.serialize()).iTOW, 20000)
+        with self.assertRaises(Exception):
+            parseNavSat(NAV_SAT_PAYLOAD[:-1], lazy=True)
+
+    def testLazyAccessors(self):
+        # nothing decoded 60 satellites yet, so no accessor of the 60th
+        payload = navSatPayload(60)
+        self.assertNotIn('elev_60', vars(UBX.NAV.SAT))
+        sat = parseNavSat(payload, lazy=True)
+        self.assertIn('elev_60', vars(UBX.NAV.SAT))
+        sat.elev_60 = -5
+        self.assertEqual(sat.elev_60, -5)
+        self.assertEqual(parseUBXMessage(sat.serialize()).elev_60, -5)
+        self.assertEqual(parseNavSat(payload).elev_60, -60)
+
+    def testSlots(self):
+        import pickle
+        sat = parseNavSat()
+        self.assertIs(type(sat), UBX.NAV.SAT)
+        self.assertEqual(UBX.NAV.SAT.__qualname__, 'NAV.SAT')
+        self.assertIn('numSvs', UBX.NAV.SAT.__slots__)
+        self.assertEqual((sat.svId_1, sat.elev_2), (5, -10))
+        with self.assertRaises(AttributeError):
+            sat.elev_3
+        sat.elev_2 = -5
+        self.assertEqual(parseUBXMessage(sat.serialize()).elev_2, -5)
+        copy = pickle.loads(pickle.dumps(sat))
+        self.assertEqual(str(copy), str(sat))
+        rxm = UBX.CFG.RXM(b'\x48\x00')
+        rxm.lpMode = 1
+        self.assertEqual(UBX.CFG.RXM(rxm.serialize()[6:-2]).lpMode, 1)
+
+    def testDetach(self):
+        buffer = bytearray(NAV_SAT_PAYLOAD)
+        lazy = parseNavSat(memoryview(buffer), lazy=True).detach()
+        columnar = parseNavSat(memoryview(buffer), columnar=True)
+        columnar.detach()
+        buffer[:] = bytes(len(buffer))      # the buffer is reused
+        self.assertEqual(lazy.elev_2, -10)
+        self.assertEqual(list(columnar.svs['elev']), [30, -10])
+        self.assertEqual(columnar.svId_2, 11)
+
+    def testMake(self):
+        payloads = [(0x0A, 0x04, b''), (0x06, 0x11, b'\x06\x11'),
+                    (0x02, 0x15, bytes(range(256)) * 3)]
+        frames = []
+        for msgClass, msgId, payload in payloads:
+            frame = UBXMessage.make(msgClass, msgId, payload)
+            chksum = UBXMessage.Checksum(frame[2:-2]).get()
+            self.assertEqual(frame[:6], bytes([0xb5, 0x62, msgClass, msgId,
+                                               len(payload) & 0xff,
+                                               len(payload) >> 8]))
+            self.assertEqual(frame[-2:], bytes([chksum >> 8, chksum & 0xff]))
+            self.assertEqual(UBXMessage.extract(frame),
+                             (msgClass, msgId, payload))
+            frames.append(frame)
+        self.assertEqual(UBXMessage.makeMany(payloads), b''.join(frames))
+        self.assertEqual(UBXMessage.makeMany([]), b'')
+        self.assertIs(UBX.MON.HW.Get().serialize(),
+                      UBX.MON.HW.Get().serialize())
+        self.assertEqual(UBX.MON.HW.Get().serialize(),
+                         UBXMessage.make(0x0A, 0x09, b''))
+
+    def testChecksum(self):
+        msg = bytes(range(256)) * 3
+        chksum = UBXMessage.Checksum()
+        for i in range(0, len(msg), 100):
+            chksum.update(msg[i:i+100])
+        single = UBXMessage.Checksum()
+        for i in msg:
+            single.update(bytes([i]))
+        self.assertEqual(chksum.get(), single.get())
+        self.assertEqual(UBXMessage.Checksum(memoryview(msg)).get(),
+                         single.get())
+        if numpy is not None:
+            data = numpy.frombuffer(msg, dtype=numpy.uint8)
+            starts = numpy.array([0, 5, 700])
+            stops = numpy.array([768, 17, 701])
+            self.assertEqual(
+                list(UBXMessage.Checksum.many(data, starts, stops)),
+                [UBXMessage.Checksum(msg[a:b]).get()
+                 for a, b in zip(starts, stops)]
+            )
+
+    def testRegistry(self):
+        self.assertIs(lookupMessage(0x0A, 0x04), UBX.MON.VER)
+        self.assertIsNone(lookupMessage(0x0A, 0x77))
+        with self.assertRaises(Exception):
+            parseUBXPayload(0x0A, 0x77, b'')
+
+        @registerMessage
+        class Custom:
+            _class = 0x0A
+            _id = 0x77
+            def __init__(self, msg):
+                self.msg = msg
+        try:
+            self.assertEqual(parseUBXPayload(0x0A, 0x77, b'ab').msg, b'ab')
+        finally:
+            import UBXMessage
+            del UBXMessage._registry[(0x0A, 0x77)]
+
+
+class TestUBXFramer(unittest.TestCase):
+
+    class Sink:
+        def __init__(self):
+            self.events = []
+        def _onUBX(self, msgClass, msgId, buffer):
+            self.events.append(('UBX', msgClass, msgId, bytes(buffer)))
+        def _onUBXError(self, msgClass, msgId, errMsg):
+            self.events.append(('UBXError', msgClass, msgId))
+        def _onNMEA(self, buffer):
+            self.events.append(('NMEA', buffer))
+        def _onNMEAError(self, errMsg):
+            self.events.append(('NMEAError',))
+
+    stream = (
+        b'$GPGGA,,,,,,0,00,99.99,,,,,,*48\r\n'
+        b'\x00\xb5\xb5' + UBX.CFG.RXM(b'\x48\x01').serialize() +
+        b'$GPTXT,bad*00\r\n' +
+        UBX.MON.VER.Get().serialize()[:-1] + b'\x00' +
+        b'garbage' + UBX.CFG.MSG.Set(msgClass=6, msgId=7, rate=8).serialize()
+    )
+    expected = [
+        ('NMEA', 'GPGGA,,,,,,0,00,99.99,,,,,,'),
+        ('UBX', 0x06, 0x11, b'\x48\x01'),
+        ('NMEAError',),
+        ('UBXError', 0x0A, 0x04),
+        ('UBX', 0x06, 0x01, b'\x06\x07\x08'),
+    ]
+
+    def testWholeStream(self):
+        sink = TestUBXFramer.Sink()
+        UBXFramer(sink).feed(self.stream)
+        self.assertEqual(sink.events, self.expected)
+
+    def testChunkedStream(self):
+        for chunkSize in [1, 2, 3, 7, 64]:
+            sink = TestUBXFramer.Sink()
+            framer = UBXFramer(sink, bufferSize=64)
+            for i in range(0, len(self.stream), chunkSize):
+                framer.feed(self.stream[i:i+chunkSize])
+            self.assertEqual(sink.events, self.expected)
+
+    def testReadFrom(self):
+        frame = UBX.RXM.RAWX(bytes(16) + bytes(32) * 60).serialize()
+        stream = io.BytesIO(self.stream + frame + self.stream)
+        sink = TestUBXFramer.Sink()
+        framer = UBXFramer(sink, bufferSize=64)
+        while framer.readFrom(stream, 50):
+            pass
+        self.assertEqual(sink.events, self.expected +
+                         [('UBX', 0x02, 0x15, frame[6:-2])] + self.expected)
+
+    def testSplitSentences(self):
+        def nmea(body):
+            return b'$%b*%02X' % (body, reduce(xor, body, 0))
+        sink = TestUBXFramer.Sink()
+        framer = UBXFramer(sink, bufferSize=64)
+        framer.feed(nmea(b'GPAAA,1') + b'\r\n')
+        framer.feed(nmea(b'GPBBB,2'))       # the buffer holds stale \r\n
+        framer.feed(UBXMessage.make(5, 1, b'\x06\x01'))
+        framer.feed(nmea(b'GPCCC,3') + b'\r')
+        framer.feed(b'\n' + nmea(b'GPDDD,4') + b'\r\n')
+        self.assertEqual(sink.events, [
+            ('NMEA', 'GPAAA,1'), ('NMEA', 'GPBBB,2'),
+            ('UBX', 5, 1, b'\x06\x01'),
+            ('NMEA', 'GPCCC,3'), ('NMEA', 'GPDDD,4'),
+        ])
+
+class TestNMEAMessage(unittest.TestCase):
+
+    GGA = 'GPGGA,092725.00,4717.11399,N,00833.91590,W,1,08,1.01,499.6,M,48.0,M,,'
+    GSV = 'GPGSV,3,1,10,23,38,230,44,29,71,156,47,07,29,116,41,08,09,081,,1'
+
+    def testParse(self):
+        gga = NMEAMessage.parseNMEASentence(self.GGA)
+        self.assertIsInstance(gga, NMEAMessage.GGA)
+        self.assertEqual(gga.talker, 'GP')
+        self.assertAlmostEqual(gga.time, 9 * 3600 + 27 * 60 + 25.0)
+        self.assertAlmostEqual(gga.lat, 47 + 17.11399 / 60)
+        self.assertAlmostEqual(gga.lon, -(8 + 33.9159 / 60))
+        self.assertEqual((gga.quality, gga.numSV, gga.alt), (1, 8, 499.6))
+        self.assertIsNone(gga.diffAge)
+
+        gsv = NMEAMessage.parseNMEASentence(self.GSV)
+        self.assertEqual(gsv.svid, [23, 29, 7, 8])
+        self.assertEqual(gsv.cno, [44, 47, 41, None])
+        self.assertEqual(gsv.signalId, 1)
+
+        gsa = NMEAMessage.parseNMEASentence(
+            'GNGSA,A,3,80,71,73,79,69,,,,,,,,1.83,1.09,1.47,2')
+        self.assertEqual(gsa.svid, [80, 71, 73, 79, 69])
+        self.assertEqual((gsa.PDOP, gsa.VDOP, gsa.systemId), (1.83, 1.47, 2))
+
+        with self.assertRaises(Exception):
+            NMEAMessage.parseNMEASentence('GPGGA,0927xx.00')
+        with self.assertRaises(Exception):
+            NMEAMessage.parseNMEASentence('GPXYZ,1,2')
+
+    def testSubscribe(self):
+        manager = UBXManager(None)
+        raw, ggas, errors = [], [], []
+        manager.onNMEA = raw.append
+        manager.onNMEAError = errors.append
+        manager._onNMEA(self.GGA)
+        self.assertEqual(raw, [self.GGA])
+
+        manager.subscribe(NMEAMessage.GGA, ggas.append)
+        manager._onNMEA(self.GGA)
+        manager._onNMEA(self.GSV)
+        manager._onNMEA('GPGGA,bad')
+        self.assertEqual(len(ggas), 1)
+        self.assertEqual(len(raw), 1)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(manager.dropped, {'GSV': 1})
+
+        manager.unsubscribe(NMEAMessage.GGA, ggas.append)
+        manager._onNMEA(self.GSV)
+        self.assertEqual(len(raw), 2)
+
+    def testColumns(self):
+        import bench
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'nmea.log')
+            with open(path, 'wb') as f:
+                bad = self.GGA.replace(',1,', ',x,', 1)   # bad quality
+                for sentence in (self.GGA, self.GSV, bad,
+                                 self.GGA[:-1] + '2.5,'):
+                    f.write(bench._nmea(sentence))
+                f.write(UBX.MON.VER.Get().serialize())
+            sentences = list(NMEAMessage.readSentences(path))
+        self.assertEqual(len(sentences), 4)
+        errors = []
+        cols = NMEAMessage.columns(sentences, NMEAMessage.GGA, errors.append)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(cols['talker'], ['GP', 'GP'])
+        self.assertEqual(len(cols['lat']), 2)
+        if numpy is not None:
+            self.assertTrue(numpy.isnan(cols['diffAge'][0]))
+            self.assertEqual(cols['diffAge'][1], 2.5)
+
+
+class TestNMEALog(unittest.TestCase):
+
+    def testConvert(self):
+        import parse_NMEA_log
+        log = (b'2020-01-01T00:00:00 GPGGA,,,,,,0,00,99.99,,,,,,\n'
+               b'dumpNMEA=True\n\n'
+               b'2020-01-01T00:00:01 GPTXT,01\r\n') * 3
+        expected = b'$GPGGA,,,,,,0,00,99.99,,,,,,*48\n$GPTXT,01*62\n'
+        self.assertEqual(parse_NMEA_log.convertChunk(log),
+                         (expected * 3, 6))
+        self.assertEqual(parse_NMEA_log.NMEAChkSum('GPTXT,01'), '62')
+        crlf = (b'2020-01-01T00:00:00 GPGGA,,,,,,0,00,99.99,,,,,, \r\n'
+                b' 2020-01-01T00:00:01 GPTXT,01\t\r\n')
+        self.assertEqual(parse_NMEA_log.convertChunk(crlf), (expected, 0))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'nmea.log')
+            with open(path, 'wb') as f:
+                f.write(log * 100)
+            out = io.BytesIO()
+            self.assertEqual(parse_NMEA_log.convert(path, out, chunkSize=64),
+                             600)
+            self.assertEqual(out.getvalue(), expected * 300)
+
+
+class TestBench(unittest.TestCase):
+
+    def testSyntheticStream(self):
+        import bench
+        stream, frames = bench.syntheticStream(epochs=20, corruption=0.1)
+        sink = TestUBXFramer.Sink()
+        UBXFramer(sink).feed(stream)
+        valid = [e for e in sink.events if e[0] in ('UBX', 'NMEA')]
+        self.assertEqual(len(valid), len(frames))
+        self.assertTrue(any(e[0].endswith('Error') for e in sink.events))
+        for frame in frames:
+            if frame[:1] == b'\xb5':
+                parseUBXMessage(frame)
+
+    def testCompare(self):
+        import bench
+        baseline = {'a': {'msg/s': 100.0}, 'b': {'msg/s': 100.0}}
+        results = {'a': {'msg/s': 95.0}, 'b': {'msg/s': 80.0}}
+        self.assertEqual(bench.compareResults(results, baseline, 0.1), ['b'])
+
+    def testMemory(self):
+        import bench
+        payload = bytes(range(8 + 12 * 20))
+        self.assertLess(
+            bench.memoryPerMessage(lambda: UBX.NAV.SAT(payload), 100),
+            bench.memoryPerMessage(
+                lambda: bench._legacyDecode(UBX.NAV.SAT, payload), 100)
+        )
+
+
+class TestUBXManager(unittest.TestCase):
+
+    def testSubscribe(self):
+        manager = UBXManager(None)
+        received = []
+        manager.onUBX = received.append
+        manager._onUBX(UBX.ACK._class, UBX.ACK.ACK._id, b'\x06\x11')
+        self.assertEqual(len(received), 1)
+
+        sats, navs = [], []
+        manager.subscribe(UBX.NAV.SAT, sats.append)
+        manager.subscribe(UBX.NAV, navs.append)
+        manager.subscribe(UBX.ACK.NAK)
+        manager._onUBX(UBX.ACK._class, UBX.ACK.ACK._id, b'\x06\x11')
+        manager._onUBX(UBX.ACK._class, UBX.ACK.NAK._id, b'\x06\x11')
+        manager._onUBX(UBX.NAV._class, UBX.NAV.SAT._id, bytes(8))
+        manager._onUBX(UBX.NAV._class, UBX.NAV.TIMEGPS._id, bytes(16))
+        manager._onUBX(UBX.MON._class, UBX.MON.VER._id, b'garbage')
+        self.assertEqual(len(received), 2)
+        self.assertEqual(len(sats), 1)
+        self.assertEqual(len(navs), 2)
+        self.assertEqual(manager.dropped, {(0x05, 0x01): 1, (0x0A, 0x04): 1})
+
+        manager.unsubscribe(UBX.NAV, navs.append)
+        manager._onUBX(UBX.NAV._class, UBX.NAV.TIMEGPS._id, bytes(16))
+        self.assertEqual(len(navs), 2)
+        self.assertEqual(manager.dropped[(0x01, 0x20)], 1)
+
+    def testRequests(self):
+        manager = UBXManager(None)
+        sent = []
+        manager.send = sent.append
+        manager.onUBX = lambda obj: None
+        rate = manager.submit(UBX.CFG.RATE.Get())
+        rxm = manager.submit(UBX.CFG.RXM.Get())
+        ver = manager.submit(UBX.MON.VER.Get())
+        ack = manager.submitAck(UBX.CFG.RXM(b'\x48\x01'))
+        self.assertEqual(len(sent), 4)
+        self.assertEqual(len(manager._requests), 4)
+        # answers arrive in any order
+        manager._onUBX(UBX.ACK._class, UBX.ACK.ACK._id, b'\x06\x11')
+        manager._onUBX(UBX.CFG._class, UBX.CFG.RATE._id,
+                       b'\xe8\x03\x01\x00\x01\x00')
+        self.assertTrue(ack.result(0))
+        self.assertEqual(rate.result(0).measRate, 1000)
+        manager._onUBX(UBX.ACK._class, UBX.ACK.NAK._id, b'\x06\x11')
+        with self.assertRaises(Exception):
+            rxm.result(0)
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            manager.request(UBX.CFG.PMS.Get(), timeout=0.01)
+        self.assertEqual(len(manager._requests), 1)
+        manager.shutdown()
+        self.assertTrue(ver.cancelled())
+        self.assertEqual(len(manager._requests), 0)
+
+    def testConfigure(self):
+        manager = UBXManager(None)
+        manager.onUBX = lambda obj: None
+        sets = []
+
+        def receiver(msg):
+            """Answer polls with response and ACK, NAK the first RATE set."""
+            cls, id, payload = msg[2], msg[3], msg[6:-2]
+            ack = (UBX.ACK._class, UBX.ACK.ACK._id, bytes([cls, id]))
+            nak = (UBX.ACK._class, UBX.ACK.NAK._id, bytes([cls, id]))
+            if id == UBX.CFG.PMS._id:
+                answers = [nak]
+            elif not payload:
+                response = bytes(6) if id == UBX.CFG.RATE._id else bytes(2)
+                answers = [(cls, id, response), ack]
+            else:
+                sets.append(msg)
+                isFirstRATE = id == UBX.CFG.RATE._id and len(sets) == 1
+                answers = [nak if isFirstRATE else ack]
+            for answer in answers:
+                manager._onUBX(*answer)
+
+        manager.send = receiver
+        results = manager.configure([
+            (UBX.CFG.RATE, {'measRate': 200}),
+            (UBX.CFG.RXM, lambda obj: setattr(obj, 'lpMode', 1)),
+            (UBX.CFG.PMS, {}),
+        ], timeout=0.01, retries=1, backoff=0)
+        self.assertEqual([r.ok for r in results], [True, True, False])
+        self.assertEqual([r.attempts for r in results], [2, 1, 2])
+        self.assertEqual(results[0].obj.measRate, 200)
+        self.assertEqual(results[1].obj.lpMode, 1)
+        self.assertEqual(results[2].error, "Poll was NAKed")
+        self.assertEqual(len(sets), 3)
+        self.assertEqual(len(manager._requests), 0)
+
+    def testRing(self):
+        manager = UBXManager(None, ring=UBXRing(4, slotSize=8))
+        received = []
+        manager.onUBX = received.append
+        manager.onNMEA = received.append
+        manager._framer.feed(
+            UBX.ACK.ACK(b'\x06\x11').serialize() +
+            b'$GPGGA,,,,,,0,00,99.99,,,,,,*48\r\n' +
+            UBX.NAV.TIMEGPS(bytes(16)).serialize()
+        )
+        self.assertEqual(received, [])
+        self.assertEqual(manager.ring.counters['oversize'], 2)
+        manager.shutdown()
+        manager._drain()
+        self.assertIsInstance(received[0], UBX.ACK.ACK)
+        self.assertEqual(received[1], "GPGGA,,,,,,0,00,99.99,,,,,,")
+        self.assertIsInstance(received[2], UBX.NAV.TIMEGPS)
+
+    def testRingPolicies(self):
+        for policy, expected in [(UBXRing.DROP_OLDEST, [b'2', b'3']),
+                                 (UBXRing.DROP_NEWEST, [b'0', b'1'])]:
+            ring = UBXRing(2, policy=policy)
+            for i in range(4):
+                ring.put(0, 1, 2, str(i).encode())
+            self.assertEqual(ring.counters['overruns'], 2)
+            self.assertEqual([ring.get()[3] for i in range(2)], expected)
+            self.assertIsNone(ring.get(timeout=0))
+        ring = UBXRing(1, policy=UBXRing.BLOCK)
+        ring.put(0, 1, 2, b'0')
+        putter = threading.Thread(target=ring.put, args=(0, 1, 2, b'1'))
+        putter.start()
+        while not ring.counters['blocked']:
+            putter.join(0.001)
+        self.assertEqual(ring.get(), (0, 1, 2, b'0'))
+        putter.join()
+        self.assertEqual(ring.get(), (0, 1, 2, b'1'))
+
+    def testStats(self):
+        manager = UBXManager(None, stats=True)
+        manager.onUBX = manager.onNMEA = lambda obj: None
+        manager.onUBXError = manager.onNMEAError = lambda *args: None
+        bad = bytearray(UBX.NAV.TIMEGPS(bytes(16)).serialize())
+        bad[-1] ^= 1
+        manager._framer.feed(
+            b'garbage' + UBX.NAV.TIMEGPS(bytes(16)).serialize() +
+            b'$GPGGA,,,,,,0,00,99.99,,,,,,*48\r\n' + bytes(bad) +
+            b'\x00\x00' + UBXMessage.make(0x0A, 0x77, b'') +
+            UBXMessage.make(0x0A, 0x04, b'garbage')
+        )
+        stats = manager.stats()
+        self.assertEqual(stats['bytesSkipped'], 9)
+        self.assertEqual(stats['resyncs'], 2)
+        self.assertEqual(stats['frames'], {
+            (0x01, 0x20): 1, (0x0A, 0x77): 1, (0x0A, 0x04): 1
+        })
+        self.assertEqual(stats['nmea'], 1)
+        self.assertEqual(stats['checksumErrors'], 1)
+        self.assertEqual(stats['unknownMessages'], {(0x0A, 0x77): 1})
+        self.assertEqual(stats['parseErrors'], 1)
+        self.assertEqual(stats['parseTime']['count'], 1)
+        self.assertEqual(stats['handlerTime']['count'], 1)
+        self.assertNotIn('frames', UBXManager(None).stats())
+
+
+class TestUBXWriter(unittest.TestCase):
+
+    class Port:
+        """Serial port whose writes block until released."""
+        def __init__(self):
+            self.writes = []
+            self.times = []
+            self.release = threading.Event()
+            self.release.set()
+        def write(self, data):
+            self.release.wait(1.0)
+            self.writes.append(data)
+            self.times.append(monotonic())
+
+    def testCoalesce(self):
+        port = self.Port()
+        port.release.clear()
+        writer = UBXWriter(port, maxWrite=100)
+        writer.write(b'first')
+        while not writer.stats()['queued'] == 0:    # being written
+            sleep(0.001)
+        for data in (b'a' * 40, b'b' * 40, b'c' * 40):
+            writer.write(data)
+        writer.write(b'urgent', priority=True)
+        self.assertEqual(writer.stats()['queuedPriority'], 1)
+        port.release.set()
+        self.assertTrue(writer.flush(1.0))
+        self.assertEqual(port.writes, [
+            b'first', b'urgent' + b'a' * 40 + b'b' * 40, b'c' * 40
+        ])
+        stats = writer.stats()
+        self.assertEqual((stats['messages'], stats['writes']), (5, 3))
+        self.assertEqual(stats['bytes'], 131)
+        self.assertEqual(stats['bytesPerSecond'], 131)
+        writer.close()
+        with self.assertRaises(Exception):
+            writer.write(b'late')
+
+    def testPacing(self):
+        port = self.Port()
+        writer = UBXWriter(port, baudrate=10000, maxWrite=100)
+        manager = UBXManager(port, writer=writer)
+        manager.send(bytes(100))
+        manager.send(bytes(100))   # 0.1 s at 10000 baud
+        self.assertTrue(writer.flush(1.0))
+        self.assertGreaterEqual(port.times[1] - port.times[0], 0.09)
+        self.assertEqual(manager.stats()['writer']['writes'], 2)
+        manager.shutdown()
+
+
+class TestUBXCapture(unittest.TestCase):
+
+    frame = UBXMessage.make(0x0a, 0x04, bytes(40))
+
+    def testWrite(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'UBX.log')
+            capture = UBXCapture(path, flushInterval=60)
+            capture.write(self.frame)
+            capture.write(b'$GPGGA,*00\r\n')
+            self.assertTrue(capture.flush(1.0))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), self.frame + b'$GPGGA,*00\r\n')
+            self.assertEqual(capture.counters['flushes'], 1)
+            capture.close()
+            with self.assertRaises(Exception):
+                capture.write(self.frame)
+
+    def testRotate(self):
+        for compress, opener in ((None, open), ('gzip', gzip.open),
+                                 ('lzma', lzma.open)):
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, 'UBX.log')
+                capture = UBXCapture(path, maxBytes=100, compress=compress)
+                data = self.frame * 5
+                capture.write(data[:130])
+                capture.write(data[130:])
+                capture.close()
+                # the 100 bytes end in the 3rd frame, split after it
+                self.assertEqual(len(capture.segments), 2)
+                self.assertTrue(capture.segments[0].endswith(
+                    'UBX-0000.log' + UBXCapture._suffixes[compress]))
+                for segment, frames in zip(capture.segments, (3, 2)):
+                    with opener(segment, 'rb') as f:
+                        self.assertEqual(f.read(), self.frame * frames)
+
+
+class TestUBXRecording(unittest.TestCase):
+
+    raw = (UBX.ACK.ACK(b'\x06\x11').serialize() +
+           b'$GPGGA,,,,,,0,00,99.99,,,,,,*48\r\n' +
+           UBX.NAV.TIMEGPS(bytes(16)).serialize())
+
+    class Port(UBXRecording.ReplayPort):
+        """Replay that shuts the manager down at its end."""
+        def read(self, size=1):
+            data = UBXRecording.ReplayPort.read(self, size)
+            if not data:
+                self.manager.shutdown()
+            return data
+
+    def testConvert(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log, rec, out = (os.path.join(tmp, name)
+                             for name in ('UBX.log', 'UBX.rec', 'out.log'))
+            with open(log, 'wb') as f:
+                f.write(self.raw)
+            self.assertEqual(UBXRecording.fromRaw(log, rec, baudrate=9600,
+                                                  chunkSize=16), 3)
+            records = list(UBXRecording.readRecords(rec, chunkSize=16))
+            self.assertEqual([r[3][:1] for r in records],
+                             [b'\xb5', b'$', b'\xb5'])
+            self.assertAlmostEqual(records[-1][0], len(self.raw) / 960)
+            self.assertEqual(UBXRecording.toRaw(rec, out), len(self.raw))
+            with open(out, 'rb') as f:
+                self.assertEqual(f.read(), self.raw)
+            with self.assertRaises(Exception):
+                list(UBXRecording.readRecords(log))
+
+    def testReplayEOF(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log, rec = os.path.join(tmp, 'UBX.log'), os.path.join(tmp, 'x.rec')
+            with open(log, 'wb') as f:
+                f.write(self.raw)
+            UBXRecording.fromRaw(log, rec)
+            port = UBXRecording.ReplayPort(rec, speed=None, timeout=0.05)
+            self.assertEqual(port.read(len(self.raw)), self.raw[:10])
+            while not port.eof:
+                port.read(len(self.raw))
+            start = monotonic()
+            self.assertEqual(port.read(), b'')
+            self.assertGreaterEqual(monotonic() - start, 0.04)
+
+    def testRecord(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log, rec = os.path.join(tmp, 'UBX.log'), os.path.join(tmp, 'x.rec')
+            with open(log, 'wb') as f:
+                f.write(self.raw)
+            UBXRecording.fromRaw(log, rec, baudrate=4800)
+            port = self.Port(rec, timeout=0)
+            recorder = UBXRecording.UBXRecorder(
+                os.path.join(tmp, 'UBX.rec'), source=3, compress='gzip'
+            )
+            manager = port.manager = UBXManager(port, capture=recorder)
+            received = []
+            poll = UBX.MON.VER.Get().serialize()
+
+            def onUBX(obj):     # answers the first frame
+                if not received:
+                    manager.send(poll)
+                received.append(obj)
+            manager.onUBX = onUBX
+            manager.onNMEA = received.append
+            start = monotonic()
+            manager.run()
+            # paced from the end of the first frame to the end of the last
+            self.assertGreaterEqual(monotonic() - start,
+                                    0.9 * (len(self.raw) - 10) / 480)
+            self.assertEqual(len(received), 3)
+            self.assertTrue(recorder.segments[0].endswith('UBX.rec.gz'))
+            records = list(UBXRecording.readRecords(recorder.segments[0]))
+            # the frame is recorded before the response of its handler
+            self.assertEqual([r[1] for r in records], [
+                UBXRecording.RX, UBXRecording.TX, UBXRecording.RX,
+                UBXRecording.RX
+            ])
+            self.assertEqual(records[1][1:], (UBXRecording.TX, 3, poll))
+            self.assertEqual(b''.join(r[3] for r in records
+                                      if r[1] == UBXRecording.RX), self.raw)
+            self.assertEqual([r[0] for r in records],
+                             sorted(r[0] for r in records))
+            self.assertEqual((recorder.counters['tx'],
+                              recorder.counters['rx']), (1, 3))
+            self.assertTrue(port.eof)
+            fast = list(UBXRecording.replay(records, speed=None))
+            self.assertEqual(fast, records)
+
+
+class TestAsyncUBXManager(unittest.TestCase):
+
+    class Receiver:
+        """Writer that answers like a receiver on the manager's reader."""
+
+        def __init__(self, reader):
+            self.reader = reader
+
+        def write(self, msg):
+            if msg == UBX.CFG.RATE.Get().serialize():
+                answer = UBX.CFG.RATE(b'\xe8\x03\x01\x00\x01\x00')
+            elif msg == UBX.CFG.RXM.Get().serialize():
+                answer = UBX.ACK.NAK(b'\x06\x11')
+            else:
+                answer = UBX.ACK.ACK(msg[2:4])
+            self.reader.feed_data(
+                UBX.NAV.TIMEGPS(bytes(16)).serialize() + answer.serialize()
+            )
+
+        async def drain(self):
+            pass
+
+        def close(self):
+            self.reader.feed_eof()
+
+        async def wait_closed(self):
+            pass
+
+    def testRequest(self):
+        async def session():
+            reader = asyncio.StreamReader()
+            manager = AsyncUBXManager(reader, self.Receiver(reader))
+            manager.start()
+            rate = await manager.request(UBX.CFG.RATE.Get(), timeout=1)
+            self.assertIsInstance(rate, UBX.CFG.RATE)
+            self.assertEqual(rate.measRate, 1000)
+            with self.assertRaises(Exception):
+                await manager.request(UBX.CFG.RXM.Get(), timeout=1)
+            ack = await manager.requestAck(rate, timeout=1)
+            self.assertTrue(ack)
+            rates = await asyncio.gather(
+                manager.request(UBX.CFG.RATE.Get(), timeout=1),
+                manager.request(UBX.CFG.RATE.Get(), timeout=1)
+            )
+            self.assertEqual([r.measRate for r in rates], [1000, 1000])
+            manager.writer.close()
+            return [msg async for msg in manager]
+        msgs = asyncio.run(session())
+        self.assertEqual(len(msgs), 5)
+        self.assertTrue(all(isinstance(m, UBX.NAV.TIMEGPS) for m in msgs))
+
+    def testClose(self):
+        async def session():
+            reader = asyncio.StreamReader()
+            manager = AsyncUBXManager(reader, self.Receiver(reader))
+            manager.start()
+            reader.feed_data(UBX.NAV.TIMEGPS(bytes(16)).serialize())
+            await asyncio.sleep(0)
+            await manager.close()
+            return await asyncio.wait_for(
+                self._collect(manager), timeout=1
+            )
+        self.assertEqual(len(asyncio.run(session())), 1)
+
+    def testSubscribe(self):
+        async def session():
+            reader = asyncio.StreamReader()
+            manager = AsyncUBXManager(reader, self.Receiver(reader))
+            manager.subscribe(UBX.NAV)
+            manager.start()
+            reader.feed_data(UBX.ACK.ACK(b'\x06\x11').serialize() +
+                             UBX.NAV.TIMEGPS(bytes(16)).serialize())
+            reader.feed_eof()
+            return manager, await self._collect(manager)
+        manager, msgs = asyncio.run(session())
+        self.assertEqual([type(m) for m in msgs], [UBX.NAV.TIMEGPS])
+        self.assertEqual(manager.dropped, {(0x05, 0x01): 1})
+
+    @staticmethod
+    async def _collect(manager):
+        return [msg async for msg in manager]
+
+
+class TestUBXHub(unittest.TestCase):
+
+    class Handler:
+        def __init__(self):
+            self.ubx, self.nmea, self.errors = [], [], []
+
+        def onUBX(self, obj):
+            self.ubx.append(obj)
+
+        def onNMEA(self, buffer):
+            self.nmea.append(buffer)
+
+        def onUBXError(self, msgClass, msgId, errMsg):
+            self.errors.append((msgClass, msgId))
+
+        def onNMEAError(self, errMsg):
+            self.errors.append(errMsg)
+
+    def setUp(self):
+        self.paths = []
+        for n in range(3):
+            fd, path = tempfile.mkstemp()
+            with os.fdopen(fd, 'wb') as f:
+                for i in range(100 * (n + 1)):
+                    f.write(UBX.NAV.TIMEGPS(bytes(16)).serialize())
+                    f.write(b'$GPGGA,,,,,,0,00,99.99,,,,,,*48\r\n')
+                f.write(UBXMessage.make(0x0A, 0x04, b'garbage'))
+            self.paths.append(path)
+
+    def tearDown(self):
+        for path in self.paths:
+            os.remove(path)
+
+    def testHub(self):
+        for decode, processes in [(True, None), (False, 2)]:
+            hub = UBXHub(processes=processes, decode=decode)
+            handlers = [TestUBXHub.Handler() for path in self.paths]
+            for path, handler in zip(self.paths, handlers):
+                hub.addSource(path, functools.partial(open, path, 'rb'),
+                              handler)
+            hub.start()
+            self.assertTrue(hub.run(timeout=10))
+            hub.shutdown()
+            for n, handler in enumerate(handlers):
+                self.assertEqual(len(handler.ubx), 100 * (n + 1))
+                self.assertIsInstance(handler.ubx[0], UBX.NAV.TIMEGPS)
+                self.assertEqual(handler.nmea[0], "GPGGA,,,,,,0,00,99.99,,,,,,")
+                self.assertEqual(handler.errors, [(0x0A, 0x04)])
+
+
+class TestUBXSimulator(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            for iTOW in range(0, 10000, 1000):
+                f.write(UBX.NAV.TIMEGPS(
+                    iTOW.to_bytes(4, 'little') + bytes(12)
+                ).serialize())
+                f.write(b'$GPGGA,,,,,,0,00,99.99,,,,,,*48\r\n')
+
+    def tearDown(self):
+        os.remove(self.path)
+        if os.path.exists(self.path + ".idx"):
+            os.remove(self.path + ".idx")
+
+    def testPty(self):
+        sim = UBXSimulator(self.path, speed=100, baudrate=115200)
+        ser = open(sim.openPty(), 'rb+', buffering=0)
+        manager = UBXManager(ser)
+        manager.daemon = True
+        received = []
+        manager.onUBX = received.append
+        manager.onNMEA = received.append
+        manager.start()
+        try:
+            self.assertEqual(
+                manager.request(UBX.CFG.RATE.Get(), timeout=1).measRate, 1000
+            )
+            results = manager.configure([(UBX.CFG.RATE, {'measRate': 200})])
+            self.assertTrue(results[0].ok)
+            self.assertEqual(
+                manager.request(UBX.CFG.RATE.Get(), timeout=1).measRate, 200
+            )
+            self.assertIsInstance(
+                manager.request(UBX.MON.VER.Get(), timeout=1), UBX.MON.VER
+            )
+            with self.assertRaises(Exception):
+                manager.request(UBX.NAV.SAT.Get(), timeout=1)
+            while sim.counters['replays'] == 0:
+                sleep(0.01)
+            sleep(0.05)
+            self.assertEqual(
+                sum(isinstance(m, UBX.NAV.TIMEGPS) for m in received), 10
+            )
+            self.assertEqual(
+                len([m for m in received if isinstance(m, str)]), 10
+            )
+        finally:
+            manager.shutdown()
+            sim.stop()
+            manager.join(1)
+            ser.close()
+
+
+class TestUBXLog(unittest.TestCase):
+
+    def setUp(self):
+        self.frames = [
+            UBX.CFG.RXM(b'\x48\x01').serialize(),
+            UBX.NAV.TIMEGPS(bytes(range(16))).serialize(),
+            UBX.MON.VER.Get().serialize(),
+            UBX.NAV.TIMEGPS(bytes(range(1, 17))).serialize(),
+        ]
+        self.offsets = []
+        stream = b'$GPTXT,x*00\r\n\xb5b\x01'
+        for frame in self.frames:
+            self.offsets.append(len(stream))
+            stream += frame + b'\xb5b\x06\x11\x02'
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as file:
+            file.write(stream)
+
+    def tearDown(self):
+        os.remove(self.path)
+        if os.path.exists(self.path + ".idx"):
+            os.remove(self.path + ".idx")
+
+    def testIndex(self):
+        with UBXLog.open(self.path) as log:
+            self.assertEqual(list(log.offsets), self.offsets)
+            self.assertEqual(list(log._scanPython(0)), self.offsets)
+            self.assertEqual(list(log.classes), [0x06, 0x01, 0x0A, 0x01])
+            self.assertEqual(list(log.lengths), [2, 16, 0, 16])
+            self.assertEqual(bytes(log.frame(2)), self.frames[2])
+
+    def testSidecarIndex(self):
+        with UBXLog.open(self.path) as log:
+            self.assertEqual(list(log.iTOW), [log.noITOW, 0x03020100,
+                                              log.noITOW, 0x04030201])
+        self.assertTrue(os.path.exists(self.path + ".idx"))
+        frame = UBX.NAV.TIMEGPS(bytes(range(2, 18))).serialize()
+        with open(self.path, 'ab') as file:
+            file.write(frame)
+        with UBXLog.open(self.path) as log:
+            self.assertEqual(len(log), 5)
+            self.assertEqual(bytes(log.frame(4)), frame)
+            sel = log.select(UBX.NAV.TIMEGPS, iTOW=(0x03020100, 0x04030201))
+            self.assertEqual(list(sel), [1, 3])
+            self.assertEqual(log.message(sel[-1]).iTOW, 0x04030201)
+        with UBXLog.open(self.path) as log:
+            self.assertEqual(len(log), 5)
+
+    def testDecode(self):
+        with UBXLog.open(self.path) as log:
+            objs = list(log.parse(UBX.NAV.TIMEGPS))
+            self.assertEqual([obj.iTOW for obj in objs],
+                             [0x03020100, 0x04030201])
+            cols = log.columns(UBX.NAV.TIMEGPS)
+            self.assertEqual(list(cols['iTOW']), [0x03020100, 0x04030201])
+            self.assertEqual(list(cols['tAcc']), [0x0F0E0D0C, 0x100F0E0D])
+
 
 if __name__ == '__main__':
     unittest.main()